@@ -1,10 +1,23 @@
+"""Run the color hustler show.
+
+    $ python . --help
+"""
+from time import perf_counter
+
+started = perf_counter()
+
+import argparse
+
 from color_hustler import Application
-use_rotos = True
+from color_hustler.startup import StartupProfile
+
+imported = perf_counter()
 
-if use_rotos:
+
+def build_rig():
+    """Return the rotators and dimmers of the standard rig."""
     from color_hustler.gobo_rotator import SmartMoveDmx, RotoQDmx, GoboSpinna, Varispeed
     from color_hustler.dimmer import Dimmer
-    import pyenttec
 
     rotos = [
         SmartMoveDmx(495),
@@ -20,13 +33,66 @@ if use_rotos:
     ]
 
     dimmers = [Dimmer(x+460) for x in range(0, 8)]
-    print(len(dimmers))
+    return rotos, dimmers
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the color hustler show.")
+    parser.add_argument(
+        '--midi-port',
+        help="midi output to play the organ on; defaults to the first one found")
+    parser.add_argument(
+        '--no-midi', action='store_true', help="discard midi instead of opening a port")
+    parser.add_argument(
+        '--no-dmx', action='store_true',
+        help="run without the DMX interface and the fixtures on it")
+    parser.add_argument('--websocket-port', type=int, default=4321)
+    parser.add_argument(
+        '--headless', action='store_true',
+        help="run without a command line until stopped by a client or a signal")
+    parser.add_argument(
+        '--split-process', action='store_true',
+        help="render the show in a worker process")
+    parser.add_argument(
+        '--asyncio', action='store_true',
+        help="run the show on the websocket server's event loop")
+    parser.add_argument(
+        '--parallel', type=int, metavar='N',
+        help="render independent organists and hustlers in N worker processes")
+    parser.add_argument(
+        '--profile-startup', action='store_true',
+        help="report how long each startup phase took once the first frame renders")
+    args = parser.parse_args()
+
+    profile = StartupProfile(started)
+    profile.add('import color_hustler', started, imported)
+
+    if args.no_dmx:
+        rotos, dimmers, port = [], [], None
+    else:
+        rotos, dimmers = build_rig()
+        with profile.phase('import pyenttec'):
+            import pyenttec
+        if args.split_process:
+            # the worker process opens the port itself
+            port = pyenttec.select_port
+        else:
+            with profile.phase('open dmx port'):
+                port = pyenttec.select_port()
 
-    port = pyenttec.select_port()
-else:
-    rotos = []
-    dimmers = []
-    port = None
+    Application(
+        dmx_port=port,
+        rotos=rotos,
+        dimmers=dimmers,
+        midi_port_name='' if args.no_midi else args.midi_port,
+        split_process=args.split_process,
+        asyncio_runtime=args.asyncio,
+        websocket_port=args.websocket_port,
+        headless=args.headless,
+        profile=profile,
+        report_startup=args.profile_startup,
+        parallel=args.parallel)
 
 
-Application(dmx_port=port, rotos=rotos, dimmers=dimmers)
+if __name__ == '__main__':
+    main()
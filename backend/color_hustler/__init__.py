@@ -1,24 +1,46 @@
 """Show setup for color hustler.
 
 Provides color selection with stochastic variants on each color parameter.
+
+Device and network backends (mido, pyenttec, websockets) are imported where
+they are first used, so the package loads quickly and on machines without
+them; a show built on loopback devices never imports them at all.
 """
 import asyncio
-import concurrent.futures
 import cmd
 import json
-from queue import Queue
+import os
+import signal
+import sys
+import traceback
+from functools import partial
 from threading import Thread
 
-import mido
-import pyenttec
-import websockets
-
+from .async_runtime import AsyncShowRunner, serve_async_show
+from .broadcast import BroadcastHub
 from .color import ColorGenerator
+from .frame_export import FrameExporter
+from .hue_organ import HueOrgan
 from .organ import ColorOrganist
 from .param_gen import Noise, ConstantList, Modulator, Waveform
+from .preset import PresetStore
 from .rate import Trigger, Rate
 from .show import Show
+from .state import StateSnapshotter, load_state, restore_state
+from .telemetry import TelemetrySampler, sample_show
+from .trace import TraceDrain
 from .leko_hustler import LekoHustler
+from .loopback import LoopbackMidiPort
+from .pixel_hustler import PixelHustler
+from .startup import StartupProfile
+from .worker import ShowWorker
+
+
+# files in the working directory where presets and show state are kept
+PRESET_PATH = 'presets.chp'
+STATE_PATH = 'show_state.pickle'
+# shared memory region rendered frames are published to for visualizers
+FRAME_EXPORT_NAME = 'color_hustler_frames'
 
 
 def label(name, index):
@@ -31,154 +53,290 @@ def sublabel(name, index):
     return labeler
 
 
-def create_show(
-    midi_port_name,
-    dmx_port=None,
-    rotos=tuple(),
-    dimmers=tuple(),
-    framerate=60.0,
-):
-    midi_port = mido.open_output(midi_port_name)
+def add_random_source(show, name, center, seed=None):
+    """Create and register a noise source, seeded from seed if provided."""
+    generator = Noise(
+        mode=Noise.GAUSSIAN,
+        center=center,
+        width=0.0,
+        seed=None if seed is None else "{}.{}".format(seed, name))
+    show.register_entity(generator, name)
+    return generator
 
-    show = Show(framerate=framerate, midi_port=midi_port, dmx_port=dmx_port)
 
-    def add_random_source(name, center):
-        generator = Noise(mode=Noise.GAUSSIAN, center=center, width=0.0)
-        show.register_entity(generator, name)
-        return generator
+def create_mod_chain(show, source, labeler):
+    """Create a standard modulation chain on source."""
+    # constant list modulation
+    offset_list = ConstantList([0.0])
+    show.register_entity(offset_list, labeler('offsets'))
 
-    def create_mod_chain(source, labeler):
-        """Create a standard modulation chain on source."""
-        # constant list modulation
-        offset_list = ConstantList([0.0])
-        show.register_entity(offset_list, labeler('offsets'))
+    offset_mod = Modulator(source=source, modulation_gen=offset_list)
+    show.register_entity(offset_mod, labeler('offsets_mod'))
 
-        offset_mod = Modulator(source=source, modulation_gen=offset_list)
-        show.register_entity(offset_mod, labeler('offsets_mod'))
+    # additive waveform modulation
+    waveform = Waveform(show.clock)
+    show.register_entity(waveform, labeler('waveform'))
 
-        # additive waveform modulation
-        waveform = Waveform()
-        show.register_entity(waveform, labeler('waveform'))
+    waveform_mod = Modulator(source=offset_mod, modulation_gen=waveform)
+    show.register_entity(waveform_mod, labeler('waveform_mod'))
 
-        waveform_mod = Modulator(source=offset_mod, modulation_gen=waveform)
-        show.register_entity(waveform_mod, labeler('waveform_mod'))
+    return waveform_mod
 
-        return waveform_mod
 
-    def create_color_chain(index):
+def create_color_generator(show, index, seed=None):
+    """Create a color generator from modulated random sources."""
+    # build modulation chains for each color coordinate
+    h_gen = add_random_source(show, label('hue', index), center=0.0, seed=seed)
+    h_mod = create_mod_chain(show, h_gen, sublabel('hue', index))
 
-        # build modulation chains for each color coordinate
-        h_gen = add_random_source(label('hue', index), center=0.0)
-        h_mod = create_mod_chain(h_gen, sublabel('hue', index))
+    s_gen = add_random_source(show, label('saturation', index), center=1.0, seed=seed)
+    s_mod = create_mod_chain(show, s_gen, sublabel('saturation', index))
 
-        s_gen = add_random_source(label('saturation', index), center=1.0)
-        s_mod = create_mod_chain(s_gen, sublabel('saturation', index))
+    l_gen = add_random_source(show, label('lightness', index), center=0.5, seed=seed)
+    l_mod = create_mod_chain(show, l_gen, sublabel('lightness', index))
 
-        l_gen = add_random_source(label('lightness', index), center=0.5)
-        l_mod = create_mod_chain(l_gen, sublabel('lightness', index))
+    return ColorGenerator(h_gen=h_mod, s_gen=s_mod, v_gen=l_mod)
 
-        color_gen = ColorGenerator(h_gen=h_mod, s_gen=s_mod, v_gen=l_mod)
 
-        note_trig = Trigger(rate=Rate(bpm=60.0))
-        show.register_entity(note_trig, label('trigger', index))
-        organist = ColorOrganist(
-            ctrl_channel=index, note_trig=note_trig, col_gen=color_gen)
-        show.organists.add(organist)
+def create_color_chain(show, index, seed=None, channel=None):
+    """Create a color organist and its generators.
 
-    create_color_chain(0)
-    create_color_chain(1)
+    The organist plays on midi channel index unless another channel is given.
+    """
+    color_gen = create_color_generator(show, index, seed=seed)
 
-    if dmx_port is not None:
-        gobo_gen = add_random_source(label('rotation', 3), center=0.0)
-        gobo_mod = create_mod_chain(gobo_gen, sublabel('rotation', 3))
+    note_trig = Trigger(rate=Rate(bpm=60.0), clock=show.clock)
+    show.register_entity(note_trig, label('trigger', index))
+    organist = ColorOrganist(
+        ctrl_channel=index if channel is None else channel,
+        note_trig=note_trig,
+        col_gen=color_gen)
+    show.organists.add(organist)
+    return organist
 
-        gobo_trig = Trigger(rate=Rate(bpm=60.0))
-        show.register_entity(gobo_trig, label('trigger', 3))
 
-        show.gobo_hustler = LekoHustler(
-            param_gen=gobo_mod, trig=gobo_trig, fixtures=rotos)
-        show.register_entity(show.gobo_hustler, 'gobo_hustler')
+def create_lamp_chain(show, index, transport, banks, seed=None, channel=None):
+    """Create a lamp organ playing banks of lamps through transport.
 
-        dimmer_gen = add_random_source(label('level', 4), center=1.0)
-        dimmer_mod = create_mod_chain(dimmer_gen, sublabel('level', 4))
+    The organ is identified by channel index unless another channel is
+    given; keep it clear of the midi organists' channels.  The transport
+    sends the lamp colors played during each frame once it is rendered.
+    """
+    color_gen = create_color_generator(show, index, seed=seed)
+
+    note_trig = Trigger(rate=Rate(bpm=60.0), clock=show.clock)
+    show.register_entity(note_trig, label('trigger', index))
+    organ = HueOrgan(
+        channel=index if channel is None else channel,
+        note_trig=note_trig,
+        col_gen=color_gen,
+        transport=transport,
+        banks=banks)
+    show.register_entity(organ, label('lamps', index))
+    show.organists.add(organ)
+    if transport.flush not in show.after_render:
+        show.after_render.append(transport.flush)
+    return organ
+
+
+def create_hustler_chain(show, name, index, center, fixtures, seed=None):
+    """Create a LekoHustler driving fixtures from a modulated random source."""
+    gen = add_random_source(show, label(name, index), center=center, seed=seed)
+    mod = create_mod_chain(show, gen, sublabel(name, index))
+
+    trig = Trigger(rate=Rate(bpm=60.0), clock=show.clock)
+    show.register_entity(trig, label('trigger', index))
+
+    return LekoHustler(
+        param_gen=mod,
+        trig=trig,
+        fixtures=fixtures,
+        clock=show.clock,
+        seed=None if seed is None else "{}.{}".format(seed, label(name, index)))
+
+
+def create_pixel_hustler(show, index, pixels, seed=None, universe_size=None):
+    """Create a PixelHustler driving pixels from a modulated color generator.
+
+    The pixels must fit in universe_size channels, by default the show's DMX
+    universe.
+    """
+    if universe_size is None:
+        universe_size = len(show.dmx_port.dmx_frame)
+    color_gen = create_color_generator(show, index, seed=seed)
 
-        dimmer_trig = Trigger(rate=Rate(bpm=60.0))
-        show.register_entity(dimmer_trig, label('trigger', 4))
+    trig = Trigger(rate=Rate(bpm=60.0), clock=show.clock)
+    show.register_entity(trig, label('trigger', index))
 
-        show.dimmer_hustler = LekoHustler(
-            param_gen=dimmer_mod, trig=dimmer_trig, fixtures=dimmers)
-        show.register_entity(show.dimmer_hustler, 'dimmer_hustler')
+    return PixelHustler(
+        col_gen=color_gen,
+        trig=trig,
+        pixels=pixels,
+        clock=show.clock,
+        seed=None if seed is None else "{}.{}".format(seed, label('pixels', index)),
+        universe_size=universe_size)
 
-    return show
 
+def create_show(
+    midi_port_name=None,
+    dmx_port=None,
+    rotos=tuple(),
+    dimmers=tuple(),
+    pixels=tuple(),
+    framerate=60.0,
+    preset_path=None,
+    midi_port=None,
+    seed=None,
+    clock=None,
+):
+    """Build the standard show.
 
-def run_websocket_server(port, cmd_queue, resp_queue):
-    """Start up a simple websocket server that deserializes messages."""
-    # Use a thread pool to concurrently poll the blocking response queue.
-    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    Either open the named midi port or pass an already-open midi_port.  If a
+    seed is provided, every random source is seeded from it so the show is
+    reproducible.  Pass a FrameClock to run the show on its own timeline.
+    """
+    if midi_port is None:
+        import mido
+        midi_port = mido.open_output(midi_port_name)
 
-    async def handle_command(websocket, path):
-        async for message in websocket:
-            try:
-                payload = json.loads(message)
-            except ValueError:
-                print("Could not deserialize message as json:", message)
-                continue
+    show = Show(
+        framerate=framerate, midi_port=midi_port, dmx_port=dmx_port, clock=clock)
+
+    create_color_chain(show, 0, seed=seed)
+    create_color_chain(show, 1, seed=seed)
+
+    if dmx_port is not None:
+        show.gobo_hustler = create_hustler_chain(
+            show, 'rotation', 3, center=0.0, fixtures=rotos, seed=seed)
+        show.register_entity(show.gobo_hustler, 'gobo_hustler')
+
+        show.dimmer_hustler = create_hustler_chain(
+            show, 'level', 4, center=1.0, fixtures=dimmers, seed=seed)
+        show.register_entity(show.dimmer_hustler, 'dimmer_hustler')
+
+        if pixels:
+            show.pixel_hustler = create_pixel_hustler(show, 5, pixels, seed=seed)
+            show.register_entity(show.pixel_hustler, 'pixel_hustler')
+
+    show.register_entity(PresetStore(show, path=preset_path), 'presets')
 
-            cmd_queue.put(payload)
+    return show
 
-    async def handle_response(websocket, path):
-        event_loop = asyncio.get_event_loop()
-        while True:
-            message = await event_loop.run_in_executor(executor, resp_queue.get)
-            await websocket.send(json.dumps(message))
 
-    async def handle(websocket, path):
-        tasks = [
-            asyncio.create_task(c)
-            for c in [
-                handle_command(websocket, path),
-                handle_response(websocket, path)]]
-        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+def run_websocket_server(port, cmd_queue, hub):
+    """Start up a simple websocket server that deserializes messages.
 
-        for task in pending:
-            task.cancel()
+    Show responses published to the hub are broadcast to every client.
+    """
+    import websockets
 
     asyncio.set_event_loop(asyncio.new_event_loop())
 
     event_loop = asyncio.get_event_loop()
+    hub.attach(event_loop)
 
-    start_server = websockets.serve(handle, "0.0.0.0", port)
+    start_server = websockets.serve(
+        hub.websocket_handler(cmd_queue.put), "0.0.0.0", port)
     event_loop.run_until_complete(start_server)
     event_loop.run_forever()
 
 
+def start_show_services(show, parallel=None):
+    """Restore saved state and start the services that run beside a show.
+
+    With parallel, the show renders in that many worker processes, forked
+    here before any service thread starts; see Show.render_in_parallel.
+
+    Return the state snapshotter and the frame exporter, which is None if
+    another show is already exporting frames.
+    """
+    # pick up where the last run left off
+    if os.path.exists(STATE_PATH):
+        try:
+            restore_state(show, load_state(STATE_PATH))
+        except Exception as err:
+            print("Could not restore show state:", err)
+        else:
+            print("Restored show state from {}.".format(STATE_PATH))
+
+    # workers carry the restored state, and forking with threads running
+    # could copy a lock one of them holds
+    if parallel:
+        show.render_in_parallel(parallel)
+
+    snapshotter = StateSnapshotter(show, STATE_PATH)
+    snapshotter.start()
+
+    # print trace records from the show without blocking it
+    TraceDrain(show.tracer).start()
+
+    # publish rendered frames for visualizers in other processes
+    try:
+        frame_exporter = FrameExporter(show, FRAME_EXPORT_NAME)
+    except FileExistsError:
+        frame_exporter = None
+        print("Frame export region {} already exists; not exporting frames.".format(
+            FRAME_EXPORT_NAME))
+
+    return snapshotter, frame_exporter
+
+
+def choose_midi_port(name=None, profile=None):
+    """Return create_show arguments for the named midi output.
+
+    Without a name, use the first output found, or discard midi if there
+    are none.  Pass an empty name to discard midi without looking.
+    """
+    profile = profile or StartupProfile()
+    if name is None:
+        with profile.phase('list midi ports'):
+            import mido
+            port_names = mido.get_output_names()
+        print("Midi outputs: {}".format(port_names))
+        name = port_names[0] if port_names else ''
+    if not name:
+        print("Not using midi.")
+        return dict(midi_port=LoopbackMidiPort())
+    print("Using midi port {}.".format(name))
+    return dict(midi_port_name=name)
+
+
 class Application(cmd.Cmd):
     """cmd module style show controller.
     Owns the show runtime environment thread.
+
+    With split_process, the show runs in a worker process instead and
+    dmx_port must be a function that opens the DMX port; see worker.  With
+    asyncio_runtime, the show runs on the websocket server's event loop; see
+    async_runtime.  See choose_midi_port for midi_port_name.
+
+    When headless, there is no command line: the show runs until it is sent
+    a stop command, SIGINT or SIGTERM.  Startup phases are timed in profile,
+    and reported once the first frame renders if report_startup is set.
+    With parallel, an in-process show renders in that many worker
+    processes; see start_show_services.
     """
 
-    def __init__(self, dmx_port=None, rotos=tuple(), dimmers=tuple()):
+    def __init__(self, dmx_port=None, rotos=tuple(), dimmers=tuple(), pixels=tuple(),
+                 midi_port_name=None, split_process=False, asyncio_runtime=False,
+                 websocket_port=4321, headless=False, profile=None, report_startup=False,
+                 parallel=None):
         cmd.Cmd.__init__(self)
         print("Color Organist")
-        port_names = mido.get_output_names()
-        print(port_names)
-        # port_name = port_names[1]
-        port_name = "IAC Driver Bus 1"
-        print("Using midi port {}.".format(port_name))
-
-        show = create_show(
-            midi_port_name=port_name,
-            dmx_port=dmx_port,
+        profile = profile or StartupProfile()
+        self.profile = profile
+
+        show_kwargs = dict(
             rotos=rotos,
             dimmers=dimmers,
+            pixels=pixels,
+            framerate=60.0,
+            preset_path=PRESET_PATH,
         )
-
-        self.cmd_queue = show.cmd_queue
+        show_kwargs.update(choose_midi_port(midi_port_name, profile))
 
         # fan the show responses out to the command line and the frontend
-        # use a fake queue that just prints synchronously to report to the command line
-        frontend_queue = Queue()
+        hub = BroadcastHub()
 
         def show_resp(resp):
             try:
@@ -189,40 +347,167 @@ class Application(cmd.Cmd):
                 if resp_type in ('message', 'error'):
                     print(payload)
 
-        show.responders = [frontend_queue.put, show_resp]
+        def print_report():
+            print(profile.report())
+
+        if split_process and asyncio_runtime:
+            raise ValueError("Choose either split_process or asyncio_runtime.")
+        if split_process and parallel:
+            # the worker process is daemonic, so it can't start workers of its own
+            raise ValueError("Parallel rendering isn't available with split_process.")
+
+        if split_process:
+            if dmx_port is not None and not callable(dmx_port):
+                raise ValueError(
+                    "In split-process mode dmx_port must be a function that opens the port.")
+            worker = ShowWorker(show_kwargs, dmx_port_factory=dmx_port)
+            worker.responders = [hub.publish, show_resp]
+
+            def resync(client, since):
+                def send_state(version, parameters):
+                    hub.send_threadsafe(client, json.dumps(
+                        ('state', dict(version=version, parameters=parameters))))
+                worker.snapshot(since, send_state)
+
+            sample = worker.sample
+            self.cmd_queue = worker
+            # the worker is joined like the show thread
+            self.show_thread = worker
+            self.frame_exporter = None
+            if report_startup:
+                # the first frame is rendered in the worker, out of sight
+                print_report()
+        else:
+            with profile.phase('build show'):
+                show = create_show(dmx_port=dmx_port, **show_kwargs)
+            show.responders = [hub.publish, show_resp]
+            with profile.phase('start show services'):
+                self.snapshotter, self.frame_exporter = start_show_services(show, parallel)
+            profile.watch_first_frame(show, print_report if report_startup else None)
+
+            # let reconnecting clients catch up on parameters changed since the
+            # version they last saw
+            def resync(client, since):
+                try:
+                    version, parameters = show.snapshot(since=since)
+                except Exception:
+                    hub.send(client, ('error', traceback.format_exc()))
+                else:
+                    hub.send(client, ('state', dict(version=version, parameters=parameters)))
+
+            sample = partial(sample_show, show)
+            if asyncio_runtime:
+                runner = AsyncShowRunner(show, asyncio.new_event_loop())
+                self.cmd_queue = runner
+                # one thread runs both the show and the websocket server
+                self.show_thread = Thread(
+                    target=lambda: serve_async_show(runner, hub, websocket_port))
+            else:
+                self.cmd_queue = show.cmd_queue
+                self.show_thread = Thread(target=show.run)
 
-        # launch the websocket server
-        self.socket_thread = Thread(
-            target=lambda: run_websocket_server(4321, show.cmd_queue, frontend_queue))
-        self.socket_thread.start()
+        hub.client_commands['resync'] = resync
+
+        # snapshot is the show's internal side of resync; answered through the
+        # hub it would be published to every client
+        def reject_snapshot(client, payload):
+            hub.send(client, ('error', "Send resync to catch up on the show state."))
+
+        hub.client_commands['snapshot'] = reject_snapshot
 
-        self.show_thread = Thread(target=show.run)
+        # start the show before the servers around it, so they load while it runs
         self.show_thread.start()
         print("Show is running.")
-        self.cmdloop()
+
+        # stream live values to clients that subscribe to them
+        self.telemetry = TelemetrySampler(hub, sample, show_kwargs['framerate'])
+        self.telemetry.start()
+
+        # launch the websocket server
+        if not asyncio_runtime:
+            self.socket_thread = Thread(
+                target=lambda: run_websocket_server(websocket_port, self.cmd_queue, hub),
+                daemon=True)
+            self.socket_thread.start()
+
+        if headless:
+            self.run_headless()
+        else:
+            self.cmdloop()
+
+    def run_headless(self):
+        """Wait for the show to stop, stopping it on SIGINT or SIGTERM."""
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.handle_command('stop'))
+        try:
+            self.show_thread.join()
+        except KeyboardInterrupt:
+            self.handle_command('stop')
+            self.show_thread.join()
+        if self.frame_exporter is not None:
+            self.frame_exporter.close()
+        if self.show_failed():
+            sys.exit(1)
+
+    def show_failed(self):
+        """Return True if the show worker stopped with an error.
+
+        A show thread's failures are reported as they happen, so this is only
+        known in split-process mode.
+        """
+        return bool(getattr(self.show_thread, 'exitcode', None))
+
+    def precmd(self, line):
+        if self.show_failed():
+            print("The show worker has stopped; exiting.")
+            self.show_thread.join()
+            sys.exit(1)
+        return line
 
     def emptyline(self):
         pass
 
-    def handle_command(self, cmd_type, payload=None):
+    def handle_command(self, cmd_type, payload=None, at=None):
         """Issue a command to the show application and handle the response."""
-        self.cmd_queue.put((cmd_type, payload))
+        if at is None:
+            self.cmd_queue.put((cmd_type, payload))
+        else:
+            self.cmd_queue.put((cmd_type, payload, at))
 
     def do_quit(self, _):
         """Quit the application."""
         self.handle_command('stop')
         self.show_thread.join()
+        if self.frame_exporter is not None:
+            self.frame_exporter.close()
+        if self.show_failed():
+            sys.exit(1)
         quit()
 
     def do_list(self, _):
         """List named entities in the current show."""
         self.handle_command('list')
 
+    def do_profile(self, action):
+        """Profile rendering: profile on|off|reset|report|<top n>."""
+        action = action.strip() or 'report'
+        payload = dict(on=True, off=False).get(action, action)
+        self.handle_command('profile', payload)
+
+    def do_trace(self, args):
+        """Enable or disable tracing a subsystem: trace dmx|command on|off."""
+        subsystem, _, enabled = args.partition(' ')
+        self.handle_command('trace', [subsystem.strip(), enabled.strip() != 'off'])
+
+    def do_get(self, name_and_parameter):
+        """Show the current value of a name.parameter."""
+        self.handle_command('get', name_and_parameter.strip())
+
     def do_cmd(self, name_and_command):
-        """Perform an action on a named entity."""
+        """Perform an action on a named entity.
+
+        Pass a third element to apply it later; see Show.schedule.
+        """
         try:
-            cmd_type, payload = eval(name_and_command)
+            self.handle_command(*eval(name_and_command))
         except Exception as err:
             print("error:", err)
-            return
-        self.handle_command(cmd_type, payload)
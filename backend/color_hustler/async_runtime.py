@@ -0,0 +1,138 @@
+"""Run a show on the same asyncio event loop as its websocket server.
+
+Instead of a show thread fed by a command queue, frames are scheduled with
+loop.call_at and commands from websocket clients are applied directly as
+they arrive, between frames, so a command is never more than one frame from
+being rendered and no thread handoff is involved.  Midi and DMX writes,
+which may block on the device, are handed to a single executor thread in
+frame order.
+"""
+import asyncio
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+
+class DeferredMidiPort:
+    """Collect midi messages during a frame and send them from an executor."""
+    def __init__(self, port, executor):
+        self.port = port
+        self.executor = executor
+        self.pending = []
+        # messages are built for the wrapped port
+        self.message_type = getattr(port, 'message_type', None)
+
+    def send(self, message):
+        self.pending.append(message)
+
+    def flush(self):
+        if self.pending:
+            self.executor.submit(self._send_all, self.pending)
+            self.pending = []
+
+    def _send_all(self, messages):
+        for message in messages:
+            self.port.send(message)
+
+
+class DeferredDmxPort:
+    """Render into a local universe and write it out from an executor.
+
+    Each rendered frame is copied once, so the next frame can be drawn while
+    the device is still being written.
+    """
+    def __init__(self, port, executor):
+        self.port = port
+        self.executor = executor
+        self.dmx_frame = bytearray(port.dmx_frame)
+
+    def render(self):
+        self.executor.submit(self._render, bytes(self.dmx_frame))
+
+    def _render(self, frame):
+        memoryview(self.port.dmx_frame)[:] = frame
+        self.port.render()
+
+
+class AsyncShowRunner:
+    """Drive a show's frames from an asyncio event loop.
+
+    The show's ports are wrapped so device writes happen on an executor
+    thread.  Call start on the loop; the runner stops the loop once the show
+    is told to stop.  Other threads send commands with put, so the runner
+    can stand in for the show's command queue.
+    """
+    def __init__(self, show, loop, executor=None):
+        self.show = show
+        self.loop = loop
+        self.executor = executor or ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='show-output')
+        self.midi_port = DeferredMidiPort(show.midi_port, self.executor)
+        show.midi_port = self.midi_port
+        if show.dmx_port is not None:
+            show.dmx_port = DeferredDmxPort(show.dmx_port, self.executor)
+        self.handle = None
+
+    def start(self):
+        self.show.running = True
+        self.show.clock.tick()
+        self._schedule()
+
+    def handle_command(self, cmd):
+        """Apply a command immediately; call on the loop thread."""
+        self.show.handle_command(cmd)
+        if not self.show.running:
+            self.stop()
+
+    def handle_command_threadsafe(self, cmd):
+        """Apply a command on the loop thread at its next opportunity."""
+        self.loop.call_soon_threadsafe(self.handle_command, cmd)
+
+    put = handle_command_threadsafe
+
+    def _schedule(self):
+        delay = self.show.render_trigger.time_until_trig()
+        self.handle = self.loop.call_at(self.loop.time() + max(delay, 0.0), self._frame)
+
+    def _frame(self):
+        show = self.show
+        if not show.running:
+            return
+        if show.render_trigger.trigger():
+            try:
+                show.render()
+            except Exception:
+                # stop like a failed show thread would, but say why, rather
+                # than leave the server taking commands for a stalled show
+                show.respond(('error', traceback.format_exc()))
+                show.running = False
+            self.midi_port.flush()
+        if show.running:
+            self._schedule()
+        else:
+            self.stop()
+
+    def stop(self):
+        """Stop rendering and any parallel workers, let pending device writes
+        finish and stop the loop.
+        """
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+        self.show.render_serially()
+        self.executor.shutdown(wait=True)
+        self.loop.stop()
+
+
+def serve_async_show(runner, hub, port):
+    """Run the runner's show and a websocket server on the runner's loop.
+
+    Return once the show has stopped.
+    """
+    import websockets
+
+    asyncio.set_event_loop(runner.loop)
+    hub.attach(runner.loop)
+    runner.loop.run_until_complete(websockets.serve(
+        hub.websocket_handler(runner.handle_command), "0.0.0.0", port))
+    runner.start()
+    runner.loop.run_forever()
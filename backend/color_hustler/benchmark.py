@@ -0,0 +1,319 @@
+"""End-to-end and micro benchmarks for the render path.
+
+Shows are built like create_show at several scales and rendered against a
+virtual clock with loopback devices, so no hardware is needed.  Results are
+written as JSON so a run can be compared against a baseline from another
+commit:
+
+    python -m color_hustler.benchmark --output baseline.json
+    python -m color_hustler.benchmark --compare baseline.json
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import timeit
+import tracemalloc
+from itertools import cycle
+from time import perf_counter, sleep
+
+from . import create_color_chain, create_hustler_chain, create_lamp_chain
+from . import create_pixel_hustler
+from . import color
+from . import param_gen
+from .dimmer import Dimmer
+from .frame_clock import FrameClock, VirtualClock
+from .gobo_rotator import RotoQDmx, lookup_dmx_val
+from .hue_organ import LampTransport
+from .pixel_hustler import pixel_strip
+from .loopback import LoopbackDmxPort, LoopbackMidiPort, RecordingLampServer
+from .show import Show
+
+CHAIN_COUNTS = (2, 16, 64)
+FIXTURE_COUNTS = (10, 100, 500)
+LAMP_COUNTS = (16, 256)
+PIXEL_COUNTS = (100, 1000)
+FRAMERATE = 60.0
+
+# midi has 16 channels; larger shows share them
+MIDI_CHANNELS = 16
+
+
+def build_show(chains, fixtures, seed=0):
+    """Build a show with color chains and dimmer fixtures, like create_show.
+
+    Return the show and the virtual clock driving it.
+    """
+    clock = VirtualClock()
+    show = Show(
+        framerate=FRAMERATE,
+        midi_port=LoopbackMidiPort(),
+        dmx_port=LoopbackDmxPort(),
+        clock=FrameClock(clock))
+
+    for index in range(chains):
+        create_color_chain(show, index, seed=seed, channel=index % MIDI_CHANNELS)
+
+    dimmers = [Dimmer(address + 1) for address in range(fixtures)]
+    show.dimmer_hustler = create_hustler_chain(
+        show, 'level', chains, center=1.0, fixtures=dimmers, seed=seed)
+    show.register_entity(show.dimmer_hustler, 'dimmer_hustler')
+
+    # give every generator something to do
+    for cmd in [
+            ('*.width', 0.1),
+            ('*_waveform*.amplitude', 0.2),
+            ('trigger*.bpm', 240.0)]:
+        show.handle_command(cmd)
+    return show, clock
+
+
+def percentile(sorted_values, fraction):
+    index = min(int(len(sorted_values) * fraction), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def timing_stats(durations):
+    """Summarize durations in seconds as microsecond statistics."""
+    durations = sorted(durations)
+    return dict(
+        mean_us=1e6 * sum(durations) / len(durations),
+        p50_us=1e6 * percentile(durations, 0.5),
+        p99_us=1e6 * percentile(durations, 0.99),
+        max_us=1e6 * durations[-1],
+    )
+
+
+def bench_render(chains, fixtures, frames):
+    """Measure per-frame render time, command latency and allocation."""
+    show, clock = build_show(chains, fixtures)
+    dt = 1.0 / FRAMERATE
+
+    # warm up
+    for _ in range(int(FRAMERATE)):
+        clock.advance(dt)
+        show.render()
+
+    durations = []
+    for _ in range(frames):
+        clock.advance(dt)
+        start = perf_counter()
+        show.render()
+        durations.append(perf_counter() - start)
+        show.midi_port.take()
+    result = dict(render=timing_stats(durations))
+
+    cmds = cycle(
+        (cmd_type, 0.5) for cmd_type in show.dispatch
+        if cmd_type.endswith('.center') or cmd_type.endswith('.amplitude'))
+    durations = []
+    for _ in range(frames):
+        cmd = next(cmds)
+        start = perf_counter()
+        show.handle_command(cmd)
+        durations.append(perf_counter() - start)
+    result['command'] = timing_stats(durations)
+
+    tracemalloc.start()
+    try:
+        allocated = 0
+        start_size, _ = tracemalloc.get_traced_memory()
+        for _ in range(frames):
+            clock.advance(dt)
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            show.render()
+            _, peak = tracemalloc.get_traced_memory()
+            allocated += peak - before
+            show.midi_port.take()
+        end_size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    result['allocation'] = dict(
+        peak_bytes_per_frame=allocated / frames,
+        retained_bytes_per_frame=(end_size - start_size) / frames,
+    )
+    return result
+
+
+def bench_lamps(lamps, frames):
+    """Measure lamp organ render time and delivery to a recording server.
+
+    Every lamp is played every frame, so all but lamp_rate of each second's
+    colors are held back by the rate limit.
+    """
+    server = RecordingLampServer()
+    server.start()
+    clock = VirtualClock()
+    show = Show(
+        framerate=FRAMERATE, midi_port=LoopbackMidiPort(), clock=FrameClock(clock))
+    names = ["lamp{}".format(index) for index in range(lamps)]
+    transport = LampTransport(
+        {name: server.address for name in names}, show.clock)
+    create_lamp_chain(show, 0, transport, {'all': [names]}, seed=0)
+    show.handle_command(('trigger*.hz', FRAMERATE))
+    dt = 1.0 / FRAMERATE
+
+    durations = []
+    try:
+        for _ in range(frames):
+            clock.advance(dt)
+            start = perf_counter()
+            show.render()
+            durations.append(perf_counter() - start)
+        # give the server a moment to catch up
+        sleep(0.2)
+    finally:
+        server.close()
+        transport.close()
+    return dict(
+        render=timing_stats(durations),
+        # updates sent but never received, and never sent for a full socket
+        delivery=dict(
+            lost=transport.sent - len(server.commands),
+            dropped=transport.dropped))
+
+
+def bench_pixels(pixels, frames):
+    """Measure pixel hustler render time with every pixel fading at once.
+
+    The pixels render into a buffer sized to fit them, which is larger than
+    a DMX universe beyond 170 pixels.
+    """
+    clock = VirtualClock()
+    show = Show(
+        framerate=FRAMERATE, midi_port=LoopbackMidiPort(), clock=FrameClock(clock))
+    strip = pixel_strip(1, pixels, layout='grb', gamma=2.2)
+    universe = bytearray(3 * pixels)
+    hustler = create_pixel_hustler(show, 0, strip, seed=0, universe_size=len(universe))
+    show.register_entity(hustler, 'pixel_hustler')
+    for cmd in [
+            ('*.width', 0.2),
+            ('pixel_hustler.bank_name', 'all'),
+            ('pixel_hustler.spread', 8),
+            ('trigger0.hz', 2.0)]:
+        show.handle_command(cmd)
+    dt = 1.0 / FRAMERATE
+
+    durations = []
+    for _ in range(frames):
+        clock.advance(dt)
+        show.clock.tick()
+        start = perf_counter()
+        hustler.render(universe)
+        durations.append(perf_counter() - start)
+    return dict(render=timing_stats(durations))
+
+
+def bench_micro(number):
+    """Measure the cost of individual conversions and lookups in ns per call."""
+    hsv = [0.3, 0.8, 0.6]
+    rgb = color.hsv_to_rgb(hsv)
+    husl_color = color.Color('husl', hsv)
+
+    cases = {
+        'color.hsv_to_rgb': lambda: color.hsv_to_rgb(hsv),
+        'color.rgb_to_hsv': lambda: color.rgb_to_hsv(rgb),
+        'color.husl_to_rgb': lambda: color.husl_to_rgb(hsv),
+        'color.rgb_to_husl': lambda: color.rgb_to_husl(rgb),
+        'color.Color.in_hsv': husl_color.in_hsv,
+        'param_gen.sine': lambda: param_gen.sine(0.3, 0.0, 1.0, False),
+        'param_gen.square': lambda: param_gen.square(0.3, 0.1, 1.0, False),
+        'param_gen.sawtooth': lambda: param_gen.sawtooth(0.3, 0.1, 1.0, False),
+        'param_gen.triangle': lambda: param_gen.triangle(0.3, 0.0, 1.0, False),
+        'gobo_rotator.lookup_dmx_val': lambda: lookup_dmx_val(
+            RotoQDmx.speeds, RotoQDmx.dmx_vals, 0.37),
+    }
+    return {
+        name: dict(ns=1e9 * min(timeit.repeat(case, number=number, repeat=5)) / number)
+        for name, case in cases.items()}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(frames=600, micro_number=20000):
+    """Run every benchmark and return the results."""
+    results = {}
+    for chains in CHAIN_COUNTS:
+        for fixtures in FIXTURE_COUNTS:
+            print("Rendering {} chains, {} fixtures...".format(chains, fixtures))
+            results["show.chains{}.fixtures{}".format(chains, fixtures)] = (
+                bench_render(chains, fixtures, frames))
+    for lamps in LAMP_COUNTS:
+        print("Playing {} lamps...".format(lamps))
+        results["lamps.lamps{}".format(lamps)] = bench_lamps(lamps, frames)
+    for pixels in PIXEL_COUNTS:
+        print("Fading {} pixels...".format(pixels))
+        results["pixels.pixels{}".format(pixels)] = bench_pixels(pixels, frames)
+    results['micro'] = bench_micro(micro_number)
+    return dict(
+        commit=git_commit(),
+        python=platform.python_version(),
+        results=results)
+
+
+def flatten(results, prefix=''):
+    """Flatten nested results into a dict of "a.b.metric" to value."""
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, prefix + key + '.'))
+        else:
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(baseline, current, tolerance):
+    """Print the change in every metric; return the names of regressions."""
+    base = flatten(baseline['results'])
+    cur = flatten(current['results'])
+    regressions = []
+    for key in sorted(base.keys() & cur.keys()):
+        if base[key] <= 0:
+            continue
+        ratio = cur[key] / base[key]
+        flag = ''
+        if ratio > 1.0 + tolerance:
+            flag = '  REGRESSION'
+            regressions.append(key)
+        print("{:60} {:12.2f} {:12.2f} {:7.2f}x{}".format(
+            key, base[key], cur[key], ratio, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, default=600)
+    parser.add_argument('--output', help="write results to this JSON file")
+    parser.add_argument('--compare', help="baseline JSON file to compare against")
+    parser.add_argument(
+        '--tolerance', type=float, default=0.1,
+        help="fractional slowdown reported as a regression")
+    args = parser.parse_args()
+
+    current = run(frames=args.frames)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print("Comparing against {} ({})".format(args.compare, baseline.get('commit')))
+        if compare(baseline, current, args.tolerance):
+            sys.exit(1)
+    elif not args.output:
+        json.dump(current, sys.stdout, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
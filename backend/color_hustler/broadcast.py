@@ -0,0 +1,149 @@
+"""Fan show responses out to every connected websocket client."""
+import asyncio
+import json
+
+
+class Client:
+    """A connected websocket client and its bounded outgoing message queue."""
+    def __init__(self, websocket, max_pending):
+        self.websocket = websocket
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        # number of messages dropped because this client fell behind
+        self.dropped = 0
+        # event loop time the queue was found full with no send completed
+        # since, or None
+        self.full_since = None
+
+
+class BroadcastHub:
+    """Broadcast show responses to all websocket clients.
+
+    The show thread posts messages into the event loop; every client has its
+    own bounded queue.  When a client falls behind the oldest pending message
+    is dropped, and a client whose queue has stayed full for send_timeout
+    seconds without completing a send is disconnected.
+    """
+    def __init__(self, max_pending=64, send_timeout=2.0):
+        self.max_pending = max_pending
+        self.send_timeout = send_timeout
+        self.loop = None
+        self.clients = set()
+        # Commands handled on behalf of a single client rather than sent to
+        # the show, as a map of command type to a callable taking the client
+        # and the command payload.  Called on the event loop thread.
+        self.client_commands = {}
+
+    def attach(self, loop):
+        """Deliver messages using this event loop."""
+        self.loop = loop
+
+    def publish(self, message):
+        """Broadcast a message to every client.
+
+        Safe to call from any thread.  Messages published before an event loop
+        is attached are discarded.
+        """
+        loop = self.loop
+        if loop is None:
+            return
+        loop.call_soon_threadsafe(self._broadcast, message)
+
+    def send(self, client, message):
+        """Send a message to a single client.
+
+        Must be called from the event loop thread.
+        """
+        self._enqueue(client, json.dumps(message))
+
+    def send_threadsafe(self, client, serialized):
+        """Send an already-serialized message to a single client.
+
+        Safe to call from any thread.
+        """
+        self.loop.call_soon_threadsafe(self._enqueue_if_connected, client, serialized)
+
+    def handle_client_command(self, client, cmd):
+        """Handle a command locally if it is a client command.
+
+        Return True if the command was handled.  A client command given an
+        apply at is handled immediately all the same.
+        """
+        if not isinstance(cmd, list) or len(cmd) not in (2, 3):
+            return False
+        try:
+            handler = self.client_commands[cmd[0]]
+        except (TypeError, KeyError):
+            return False
+        handler(client, cmd[1])
+        return True
+
+    def _broadcast(self, message):
+        # serialize once no matter how many clients are listening
+        serialized = json.dumps(message)
+        for client in list(self.clients):
+            self._enqueue(client, serialized)
+
+    def _enqueue(self, client, serialized):
+        if client.queue.full():
+            now = self.loop.time()
+            if client.full_since is None:
+                client.full_since = now
+            elif now - client.full_since > self.send_timeout:
+                self.disconnect(client)
+                return
+            client.queue.get_nowait()
+            client.dropped += 1
+        client.queue.put_nowait(serialized)
+
+    def _enqueue_if_connected(self, client, serialized):
+        if client in self.clients:
+            self._enqueue(client, serialized)
+
+    def disconnect(self, client):
+        """Stop sending to a client and close its connection."""
+        if client in self.clients:
+            self.clients.remove(client)
+            print("Disconnecting slow websocket client.")
+            self.loop.create_task(client.websocket.close())
+
+    def websocket_handler(self, on_command):
+        """Return a websocket connection handler for this hub.
+
+        Client commands are handled by the hub; every other JSON message is
+        passed to on_command on the event loop thread.
+        """
+        async def handle_messages(client):
+            async for message in client.websocket:
+                try:
+                    payload = json.loads(message)
+                except ValueError:
+                    print("Could not deserialize message as json:", message)
+                    continue
+
+                if not self.handle_client_command(client, payload):
+                    on_command(payload)
+
+        async def handle(websocket, path=None):
+            client = Client(websocket, self.max_pending)
+            tasks = [
+                asyncio.create_task(c)
+                for c in [
+                    handle_messages(client),
+                    self.serve(client)]]
+            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+
+            for task in pending:
+                task.cancel()
+
+        return handle
+
+    async def serve(self, client):
+        """Send queued messages to a client until it disconnects."""
+        self.clients.add(client)
+        try:
+            while True:
+                message = await client.queue.get()
+                await client.websocket.send(message)
+                client.full_since = None
+        finally:
+            self.clients.discard(client)
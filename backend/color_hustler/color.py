@@ -77,6 +77,45 @@ def rgb_to_hsv(coordinates):
 
     return [hue, saturation, value]
 
+def srgb_to_linear(value):
+    """Convert an sRGB component to linear light."""
+    if value <= 0.04045:
+        return value / 12.92
+    return ((value + 0.055) / 1.055) ** 2.4
+
+# Oklab coordinates run outside the unit range, so it isn't one of the Color
+# spaces; these work on bare components.
+
+def linear_rgb_to_oklab(red, green, blue):
+    """Convert linear light RGB to the perceptually uniform Oklab space."""
+    l = 0.4122214708*red + 0.5363288310*green + 0.0514459929*blue
+    m = 0.2119034982*red + 0.6806995457*green + 0.1073969566*blue
+    s = 0.0883024619*red + 0.2817188376*green + 0.6299787005*blue
+
+    l = l ** (1.0 / 3.0) if l > 0.0 else 0.0
+    m = m ** (1.0 / 3.0) if m > 0.0 else 0.0
+    s = s ** (1.0 / 3.0) if s > 0.0 else 0.0
+
+    return (
+        0.2104542553*l + 0.7936177850*m - 0.0040720468*s,
+        1.9779984951*l - 2.4285922050*m + 0.4505937099*s,
+        0.0259040371*l + 0.7827717662*m - 0.8086757660*s)
+
+def oklab_to_linear_rgb(lightness, a, b):
+    """Convert Oklab to linear light RGB, which may be out of gamut."""
+    l = lightness + 0.3963377774*a + 0.2158037573*b
+    m = lightness - 0.1055613458*a - 0.0638541728*b
+    s = lightness - 0.0894841775*a - 1.2914855480*b
+
+    l = l * l * l
+    m = m * m * m
+    s = s * s * s
+
+    return (
+        4.0767416621*l - 3.3077115913*m + 0.2309699292*s,
+        -1.2684380046*l + 2.6097574011*m - 0.3413193965*s,
+        -0.0041960863*l - 0.7034186147*m + 1.7076147010*s)
+
 def identity(coordinates):
     return coordinates
 
@@ -308,6 +347,10 @@ class ColorGenerator:
 
         return Color(self.colorspace, (h_val, s_val, v_val))
 
+    def get_many(self, count):
+        """Get the next count colors from this generator."""
+        return [self.get() for _ in range(count)]
+
 
 class ColorSwarm:
     """Agglomerate multiple color generators."""
@@ -338,3 +381,14 @@ class ColorSwarm:
         col = self.gens[self.next].get()
         return col
 
+    def get_many(self, count):
+        """Get count colors, taking them from the generators in turn."""
+        return [self.get() for _ in range(count)]
+
+    def get_state(self):
+        return dict(next=self.next, rand=self.rand_gen.getstate())
+
+    def set_state(self, state):
+        self.next = state['next']
+        self.rand_gen.setstate(state['rand'])
+
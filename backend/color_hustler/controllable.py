@@ -5,6 +5,15 @@ class Controllable:
     # Validators should raise ValueError for invalid content.
     parameters = {}
 
+    # Names of parameters that perform an action rather than hold state.
+    actions = frozenset()
+
+    # Names of parameters that are alternate views of another parameter.
+    aliases = frozenset()
+
+    # Names of attributes holding live values that can be sampled for telemetry.
+    telemetry = ()
+
     def set_parameter(self, name, value):
         """Set the named parameter using setattr if value parses correctly.
 
@@ -19,6 +28,55 @@ class Controllable:
         parsed = parser(value)
         setattr(self, name, parsed)
 
+    def get_parameter(self, name):
+        """Return the current value of the named parameter.
+
+        Raise ValueError if the name is invalid or names an action.
+        """
+        if name not in self.parameters or name in self.actions:
+            raise ValueError('No readable parameter with name "{}".'.format(name))
+        return getattr(self, name)
+
+    def snapshot(self):
+        """Return a dict of the current value of every readable parameter.
+
+        Aliases are left out, as the parameter they view is included.
+        """
+        return {
+            name: getattr(self, name)
+            for name in self.parameters
+            if name not in self.actions and name not in self.aliases}
+
+    def get_state(self):
+        """Return runtime state that parameters don't capture, or None.
+
+        Inheriting classes with internal state such as RNGs or phase should
+        override this and set_state so a restarted show can pick up where it
+        left off.
+        """
+        return None
+
+    def set_state(self, state):
+        """Restore runtime state returned by get_state."""
+        pass
+
+    def parameter_setter(self, name):
+        """Return a callable that parses a value and sets the named parameter.
+
+        The parameter lookup is performed once, up front, so that repeated
+        calls to the returned setter skip it entirely.
+
+        Raise ValueError if the name is invalid.
+        """
+        try:
+            parser = self.parameters[name]
+        except KeyError:
+            raise ValueError('No parameter with name "{}".'.format(name))
+
+        def set_parameter(value):
+            setattr(self, name, parser(value))
+        return set_parameter
+
 def validate_string_constant(allowed_values, parameter_description):
     def validate(value):
         if value not in allowed_values:
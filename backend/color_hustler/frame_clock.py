@@ -1,15 +1,49 @@
-# Global source of current frame time.
-# FIXME: move this into the top-level show and inject it into clients.
-# This is a stopgap put in place to ease refactoring.
+"""Clocks providing the current frame time to time-dependent entities.
+
+The show owns a FrameClock and passes it to every entity that needs the time,
+so independent shows can run side by side, each on its own timeline.
+"""
 from time import monotonic
 
-# this should be properly initialized on the first frame.
-_now = None
 
-def time():
-    global _now
-    return _now
+class FrameClock:
+    """The time of the current frame, sampled from a time source once per frame.
+
+    Everything rendered during a frame sees the same time, and reading it is
+    just an attribute lookup.  The source is any callable returning seconds;
+    use time.monotonic for a live show or a VirtualClock to simulate one.
+    """
+    def __init__(self, source=monotonic):
+        self.source = source
+        self._now = source()
+
+    def time(self):
+        return self._now
+
+    def tick(self):
+        """Advance to a new frame, sampling the current time."""
+        self._now = self.source()
+
+
+class LiveClock:
+    """A clock that reads its source every time it is asked.
+
+    Used to schedule the frames themselves.
+    """
+    def __init__(self, source=monotonic):
+        self.source = source
+
+    def time(self):
+        return self.source()
+
+
+class VirtualClock:
+    """A time source that only moves when advanced."""
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
 
-def tick():
-    global _now
-    _now = monotonic()
\ No newline at end of file
+    def advance(self, dt):
+        self.now += dt
@@ -0,0 +1,152 @@
+"""Publish rendered frames to shared memory for visualizers in other processes.
+
+The region starts with a fixed header, followed by the DMX universe and the
+HSV color last played by each organist:
+
+    magic, version, universe size, organist count   '<4sHHH' + 2 pad bytes
+    sequence number                                 '<Q'
+    frame number, show time                         '<Qd'
+    DMX universe                                    universe size bytes
+    per organist: midi channel, hue, sat, value     '<B3d'
+
+The sequence number is a seqlock: the writer makes it odd before touching the
+frame and even again when done.  A reader copies the frame out and retries if
+the sequence number was odd or changed while it was copying, so it never sees
+a half-written frame and the writer never waits for a reader.
+"""
+import struct
+from multiprocessing import shared_memory
+
+from .ipc import attach_shared_memory
+
+FRAME_EXPORT_MAGIC = b'CHFX'
+FRAME_EXPORT_VERSION = 1
+
+_HEADER = struct.Struct('<4sHHHxx')
+_SEQ = struct.Struct('<Q')
+_FRAME = struct.Struct('<Qd')
+_COLOR = struct.Struct('<B3d')
+
+_SEQ_OFFSET = _HEADER.size
+_FRAME_OFFSET = _SEQ_OFFSET + _SEQ.size
+_UNIVERSE_OFFSET = _FRAME_OFFSET + _FRAME.size
+
+_NO_COLOR = (float('nan'),) * 3
+
+
+def region_size(universe_size, organist_count):
+    return _UNIVERSE_OFFSET + universe_size + organist_count * _COLOR.size
+
+
+class FrameExporter:
+    """Copy every rendered frame of a show into a named shared memory region.
+
+    Organists and the DMX port are captured when the exporter is created, so
+    create it once the show is fully built.
+    """
+    def __init__(self, show, name):
+        self.show = show
+        self.organists = show.ordered_organists()
+        self.universe_size = (
+            len(show.dmx_port.dmx_frame) if show.dmx_port is not None else 0)
+        self.colors_offset = _UNIVERSE_OFFSET + self.universe_size
+
+        self.shm = shared_memory.SharedMemory(
+            name=name,
+            create=True,
+            size=region_size(self.universe_size, len(self.organists)))
+        self.buf = self.shm.buf
+        _HEADER.pack_into(
+            self.buf, 0,
+            FRAME_EXPORT_MAGIC,
+            FRAME_EXPORT_VERSION,
+            self.universe_size,
+            len(self.organists))
+        self.seq = 0
+        _SEQ.pack_into(self.buf, _SEQ_OFFSET, self.seq)
+
+        show.after_render.append(self.publish)
+
+    def publish(self):
+        """Write the frame just rendered; runs on the render thread."""
+        buf = self.buf
+        show = self.show
+        seq = self.seq + 1
+        _SEQ.pack_into(buf, _SEQ_OFFSET, seq)
+
+        _FRAME.pack_into(buf, _FRAME_OFFSET, show.frame, show.clock.time())
+        if self.universe_size:
+            buf[_UNIVERSE_OFFSET:self.colors_offset] = show.dmx_port.dmx_frame
+        offset = self.colors_offset
+        for organist in self.organists:
+            _COLOR.pack_into(
+                buf, offset, organist.ctrl_channel, *(organist.color or _NO_COLOR))
+            offset += _COLOR.size
+
+        self.seq = seq + 1
+        _SEQ.pack_into(buf, _SEQ_OFFSET, self.seq)
+
+    def close(self):
+        """Stop publishing and remove the shared memory region."""
+        if self.publish in self.show.after_render:
+            self.show.after_render.remove(self.publish)
+        self.buf = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+class Frame:
+    """One consistent exported frame."""
+    def __init__(self, frame, time, dmx, colors):
+        self.frame = frame
+        self.time = time
+        # bytes of the DMX universe
+        self.dmx = dmx
+        # midi channel to HSV color, or None if the organist hasn't played
+        self.colors = colors
+
+
+class FrameReader:
+    """Read frames exported by a FrameExporter, possibly in another process."""
+    def __init__(self, name):
+        self.shm = attach_shared_memory(name)
+        self.buf = self.shm.buf
+
+        magic, version, self.universe_size, self.organist_count = (
+            _HEADER.unpack_from(self.buf, 0))
+        if magic != FRAME_EXPORT_MAGIC or version != FRAME_EXPORT_VERSION:
+            raise ValueError("{} is not a frame export region.".format(name))
+        self.colors_offset = _UNIVERSE_OFFSET + self.universe_size
+
+    @property
+    def seq(self):
+        """The sequence number; changes whenever a new frame is published."""
+        return _SEQ.unpack_from(self.buf, _SEQ_OFFSET)[0]
+
+    def read(self, max_attempts=100):
+        """Return the latest complete Frame, or None if no frame has been
+        published yet.
+
+        Raise RuntimeError if the writer kept the frame busy for every attempt.
+        """
+        buf = self.buf
+        for _ in range(max_attempts):
+            start = _SEQ.unpack_from(buf, _SEQ_OFFSET)[0]
+            if start % 2:
+                continue
+            frame, time = _FRAME.unpack_from(buf, _FRAME_OFFSET)
+            dmx = bytes(buf[_UNIVERSE_OFFSET:self.colors_offset])
+            colors = {}
+            for index in range(self.organist_count):
+                channel, *hsv = _COLOR.unpack_from(
+                    buf, self.colors_offset + index * _COLOR.size)
+                colors[channel] = hsv if hsv[0] == hsv[0] else None
+            if _SEQ.unpack_from(buf, _SEQ_OFFSET)[0] == start:
+                if start == 0:
+                    return None
+                return Frame(frame, time, dmx, colors)
+        raise RuntimeError("Could not read a consistent frame.")
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
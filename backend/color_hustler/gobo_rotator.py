@@ -1,5 +1,6 @@
 """Fixture driver for various gobo rotators."""
 from bisect import bisect_left
+from functools import lru_cache
 
 __all__ = (
     'GoboSpinna',
@@ -40,6 +41,25 @@ def build_lut(meas):
 def delta(vals):
     return [h - l for l, h in zip(vals, vals[1:])]
 
+class LazyLut:
+    """Class attribute holding part of a LUT, built the first time it's read.
+
+    build returns a tuple of tables and index picks one of them.  Once built
+    the table replaces this descriptor on the class, so reads cost no more
+    than any other class attribute.
+    """
+    def __init__(self, build, index):
+        self.build = build
+        self.index = index
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, owner):
+        table = self.build()[self.index]
+        setattr(owner, self.name, table)
+        return table
+
 """
 --- GOBO SPINNAZ ---
 
@@ -145,7 +165,6 @@ class Varispeed:
         index = self.address - 1
         self._render_single(self.g0, buf, index)
         self._render_single(self.g1, buf, index+2)
-        print(buf)
 
     def _render_single(self, value, buf, index):
         speed_int = min(int(abs(value) * 245.0) + 5, 255)
@@ -207,6 +226,7 @@ ROTO_Q_MEAS = [
     (255, 0.43),
 ]
 
+@lru_cache(maxsize=None)
 def roto_q_lut():
     # upper range
     lut = build_lut(ROTO_Q_MEAS)
@@ -242,7 +262,8 @@ class RotoQDmx:
     0: direction/speed
     1: set to 0 for rotation mode
     """
-    speeds, dmx_vals = roto_q_lut()
+    speeds = LazyLut(roto_q_lut, 0)
+    dmx_vals = LazyLut(roto_q_lut, 1)
 
     def __init__(self, address):
         self.address = address
@@ -302,6 +323,7 @@ SMART_MOVE_MEAS = [
     (255, 0.344),
 ]
 
+@lru_cache(maxsize=None)
 def smart_move_lut():
     # upper range
     lut = build_lut(SMART_MOVE_MEAS)
@@ -330,7 +352,8 @@ class SmartMoveDmx:
     1: set to 0 for rotation mode
     2: set to 0 for rotation mode
     """
-    speeds, dmx_vals = smart_move_lut()
+    speeds = LazyLut(smart_move_lut, 0)
+    dmx_vals = LazyLut(smart_move_lut, 1)
 
     def __init__(self, address):
         self.address = address
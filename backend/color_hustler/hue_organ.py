@@ -1,38 +1,190 @@
-"""Primitive color organ implementation feeding hue lamps."""
+"""Color organ feeding networked color lamps over UDP.
+
+Lamps are reached through bridges, each listening for UDP datagrams.  A
+LampTransport collects the colors every lamp organ plays during a frame and,
+once the frame is rendered, sends them with one datagram per bridge:
+
+    {"lamps": {"<lamp>": [red, green, blue], ...}}
+
+with each component an int from 0 to 255.  Bridges only take so many
+updates per lamp per second, so each lamp is limited to lamp_rate updates a
+second; a color played for a lamp that isn't due yet waits, replacing any
+color already waiting, and goes out with the first flush after the lamp
+comes due.  Sockets are non-blocking and pooled, one per bridge, so a
+flush never waits on the network: a datagram the socket can't take right
+now is dropped and its colors are retried on the next flush.
+
+    transport = LampTransport({'left': bridge, 'right': bridge}, show.clock)
+    show.after_render.append(transport.flush)
+    organ = HueOrgan(8, trig, color_gen, transport, {'chase': ['left', 'right']})
+    show.organists.add(organ)
+"""
+import json
+import socket
 from itertools import cycle
-from ip_hue import HueTransmitter
-from .name_registry import register_name
-from .organ import InvalidBankError
-
-class HueOrgan(object):
-    """Takes a stream of colors and sends them to hue lamps."""
-    def __init__(self, banks, start_bank=None, ttime=None):
-        self.banks = banks
-        # pick a random bank if we didn't specify one
-        self.current_bank = banks.values()[0] if start_bank is None else banks[start_bank]
-
-        # keep track of where we are in the bank with an iterator
-        self.pattern_iter = cycle(self.current_bank)
-
-        # hack for now, depend on the ip_hue package for default setup
-        self.lamp_trans = HueTransmitter()
-
-    def send_color(self, color):
-        """Send a color message to the next set of hue lamps."""
-        color_rgb = color.in_rgb()
-        color = (color_rgb.red, color_rgb.green, color_rgb.blue)
-        lamps = next(self.pattern_iter)
-        if isinstance(lamps, str):
-            lamps = (lamps,)
-        for lamp in lamps:
-            self.lamp_trans.send_color(lamp, color)
-
-    def select_bank(self, bank):
-        """Select a named bank."""
+
+from .controllable import Controllable
+from .rate import validate_positive
+
+# lamp updates per datagram, keeping datagrams well under a typical MTU
+LAMPS_PER_DATAGRAM = 32
+
+
+def to_8bit(number):
+    """Convert a float on the range [0,1] to an int on the range [0,255]."""
+    return min(max(int(number * 256.0), 0), 255)
+
+
+class LampTransport(Controllable):
+    """Batch lamp colors per frame and send them to their bridges over UDP.
+
+    lamps maps each lamp name to the (host, port) address of its bridge.
+    """
+    parameters = dict(
+        lamp_rate=validate_positive,
+    )
+
+    telemetry = ('sent', 'waiting', 'dropped')
+
+    def __init__(self, lamps, clock, lamp_rate=10.0):
+        self.lamps = dict(lamps)
+        self.clock = clock
+        self.lamp_rate = lamp_rate
+
+        # bridge address to its connected, non-blocking socket
+        self.sockets = {}
+        # lamp name to the rgb color waiting to be sent
+        self.pending = {}
+        # lamp name to the earliest time it may be sent another color
+        self.next_send = {}
+
+        # lamp updates sent, waiting on the rate limit, and lost to full sockets
+        self.sent = 0
+        self.waiting = 0
+        self.dropped = 0
+
+    def send_color(self, lamp, rgb):
+        """Queue a color for a lamp, replacing any color already waiting."""
+        if lamp not in self.lamps:
+            raise ValueError("No lamp named {}.".format(lamp))
+        self.pending[lamp] = rgb
+
+    def flush(self):
+        """Send every waiting color whose lamp is due, one batch per bridge."""
+        if not self.pending:
+            return
+        now = self.clock.time()
+        batches = {}
+        for lamp, rgb in self.pending.items():
+            if self.next_send.get(lamp, now) <= now:
+                batches.setdefault(self.lamps[lamp], {})[lamp] = rgb
+
+        interval = 1.0 / self.lamp_rate
+        for address, batch in batches.items():
+            lamps = list(batch.items())
+            for start in range(0, len(lamps), LAMPS_PER_DATAGRAM):
+                chunk = dict(lamps[start:start + LAMPS_PER_DATAGRAM])
+                if self._send(address, chunk):
+                    for lamp in chunk:
+                        del self.pending[lamp]
+                        self.next_send[lamp] = now + interval
+                    self.sent += len(chunk)
+                else:
+                    self.dropped += len(chunk)
+        self.waiting = len(self.pending)
+
+    def _send(self, address, lamps):
+        """Send one datagram; return False if the socket couldn't take it."""
+        datagram = json.dumps({'lamps': lamps}, separators=(',', ':')).encode()
+        try:
+            self._socket(address).send(datagram)
+        except BlockingIOError:
+            return False
+        except OSError:
+            # the bridge refused an earlier datagram; start over with a new socket
+            sock = self.sockets.pop(address, None)
+            if sock is not None:
+                sock.close()
+            return False
+        return True
+
+    def _socket(self, address):
         try:
-            self.current_bank = self.banks[bank]
-            self.pattern_iter = cycle(self.current_bank)
+            return self.sockets[address]
         except KeyError:
-            raise InvalidBankError(
-                "{} is not a valid bank.  Valid banks are {}"
-                .format(bank, self.banks.keys()))
\ No newline at end of file
+            pass
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        sock.connect(address)
+        self.sockets[address] = sock
+        return sock
+
+    def close(self):
+        for sock in self.sockets.values():
+            sock.close()
+        self.sockets.clear()
+
+
+class HueOrgan(Controllable):
+    """Takes a stream of colors and plays them on banks of lamps.
+
+    Each bank is a list of steps, each step a lamp name or a list of lamp
+    names; every trigger plays the next color on the next step of the
+    selected bank.  channel identifies the organ alongside the midi
+    organists, so it should not be shared with one of them.
+    """
+    parameters = dict(
+        bank=str,
+    )
+
+    telemetry = ('color', 'lamps')
+
+    def __init__(self, channel, note_trig, col_gen, transport, banks, bank=None):
+        if not banks:
+            raise ValueError("A lamp organ needs at least one bank.")
+        self.ctrl_channel = channel
+        self.note_trig = note_trig
+        self.col_gen = col_gen
+        self.transport = transport
+        self.banks = {
+            name: [(step,) if isinstance(step, str) else tuple(step) for step in steps]
+            for name, steps in banks.items()}
+        for steps in self.banks.values():
+            for step in steps:
+                for lamp in step:
+                    if lamp not in transport.lamps:
+                        raise ValueError("No lamp named {}.".format(lamp))
+
+        self._bank = None
+        self.bank = next(iter(self.banks)) if bank is None else bank
+        # HSV coordinates of the last color played
+        self.color = None
+        # lamps the last color was played on
+        self.lamps = ()
+
+    @property
+    def bank(self):
+        return self._bank
+
+    @bank.setter
+    def bank(self, bank):
+        if bank not in self.banks:
+            raise ValueError(
+                "{} is not a valid bank.  Valid banks are {}".format(
+                    bank, sorted(self.banks)))
+        if bank != self._bank:
+            self._bank = bank
+            self._steps = cycle(self.banks[bank])
+
+    def play(self, midi_port):
+        """Play the next step if the moment is right; lamps don't use midi."""
+        if not self.note_trig.trigger():
+            return
+
+        color = self.col_gen.get()
+        self.color = color.in_hsv().coordinates
+        rgb = tuple(to_8bit(coord) for coord in color.in_rgb().coordinates)
+
+        self.lamps = next(self._steps)
+        for lamp in self.lamps:
+            self.transport.send_color(lamp, rgb)
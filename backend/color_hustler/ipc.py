@@ -0,0 +1,178 @@
+"""Pass messages between processes through shared memory rings.
+
+A ShmRing is a single-producer, single-consumer byte ring in a named
+multiprocessing.shared_memory region.  The writer owns the tail counter and
+the reader owns the head counter, so neither side ever takes a lock or makes
+a system call to pass a message.  Each message is a 4-byte length followed
+by the payload, padded to 4 bytes; a message that doesn't fit before the end
+of the ring is preceded by a wrap marker and written at the start.
+"""
+import pickle
+import struct
+from multiprocessing import resource_tracker, shared_memory
+from queue import Empty, Full
+from threading import Lock
+from time import monotonic, sleep
+
+# head and tail counters live on separate cache lines
+_COUNTER = struct.Struct('<Q')
+_HEAD_OFFSET = 0
+_TAIL_OFFSET = 64
+_DATA_OFFSET = 128
+
+_LENGTH = struct.Struct('<I')
+_WRAP = 0xFFFFFFFF
+
+# how long a blocking get or put sleeps between polls of the ring
+POLL_INTERVAL = 0.0005
+
+
+def _padded(length):
+    return (length + 3) & ~3
+
+
+class ShmRing:
+    """Single-producer, single-consumer ring of byte messages.
+
+    Create the ring in one process and attach to it by name in the other.
+    Only one thread may put and only one thread may get at a time.  See
+    attach_shared_memory for shared_tracker.
+    """
+    def __init__(self, name=None, capacity=1 << 20, create=False, shared_tracker=False):
+        if create:
+            capacity = _padded(capacity)
+            self.shm = shared_memory.SharedMemory(
+                name=name, create=True, size=_DATA_OFFSET + capacity)
+        else:
+            self.shm = attach_shared_memory(name, shared_tracker)
+        self.name = self.shm.name
+        self.owner = create
+        self.buf = self.shm.buf
+        # the region may have been rounded up to a whole page
+        self.capacity = (self.shm.size - _DATA_OFFSET) & ~3
+        if create:
+            _COUNTER.pack_into(self.buf, _HEAD_OFFSET, 0)
+            _COUNTER.pack_into(self.buf, _TAIL_OFFSET, 0)
+
+    def put(self, data):
+        """Append a message; return False if there isn't room for it."""
+        buf = self.buf
+        capacity = self.capacity
+        size = _LENGTH.size + _padded(len(data))
+        if size > capacity:
+            raise ValueError(
+                "Message of {} bytes is too big for the ring.".format(len(data)))
+
+        tail = _COUNTER.unpack_from(buf, _TAIL_OFFSET)[0]
+        head = _COUNTER.unpack_from(buf, _HEAD_OFFSET)[0]
+        position = tail % capacity
+        to_end = capacity - position
+        needed = size if size <= to_end else to_end + size
+        if capacity - (tail - head) < needed:
+            return False
+
+        if size > to_end:
+            _LENGTH.pack_into(buf, _DATA_OFFSET + position, _WRAP)
+            tail += to_end
+            position = 0
+
+        start = _DATA_OFFSET + position
+        _LENGTH.pack_into(buf, start, len(data))
+        buf[start + _LENGTH.size:start + _LENGTH.size + len(data)] = data
+        # publish the message only once it has been written
+        _COUNTER.pack_into(buf, _TAIL_OFFSET, tail + size)
+        return True
+
+    def get(self):
+        """Remove and return the oldest message, or None if the ring is empty."""
+        buf = self.buf
+        capacity = self.capacity
+        head = _COUNTER.unpack_from(buf, _HEAD_OFFSET)[0]
+        tail = _COUNTER.unpack_from(buf, _TAIL_OFFSET)[0]
+        if head == tail:
+            return None
+
+        position = head % capacity
+        length = _LENGTH.unpack_from(buf, _DATA_OFFSET + position)[0]
+        if length == _WRAP:
+            head += capacity - position
+            position = 0
+            length = _LENGTH.unpack_from(buf, _DATA_OFFSET)[0]
+
+        start = _DATA_OFFSET + position + _LENGTH.size
+        data = bytes(buf[start:start + length])
+        _COUNTER.pack_into(
+            buf, _HEAD_OFFSET, head + _LENGTH.size + _padded(length))
+        return data
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def attach_shared_memory(name, shared_tracker=False):
+    """Attach to a shared memory region owned by another process.
+
+    Pass shared_tracker=True in a process started by multiprocessing from the
+    owner, which shares the owner's resource tracker.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # before python 3.13 attaching registers the region for removal when
+        # this process exits, which would pull it out from under its owner
+        shm = shared_memory.SharedMemory(name=name)
+        if not shared_tracker:
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+class RingQueue:
+    """A queue.Queue look-alike that pickles objects through a ShmRing.
+
+    Puts are serialized with a lock so several threads may put; only one
+    thread may get.  Blocking calls poll the ring.
+    """
+    def __init__(self, ring):
+        self.ring = ring
+        self._put_lock = Lock()
+
+    def put(self, item, block=True, timeout=None):
+        data = pickle.dumps(item, protocol=pickle.HIGHEST_PROTOCOL)
+        deadline = None if timeout is None else monotonic() + timeout
+        with self._put_lock:
+            while not self.ring.put(data):
+                if not block or (deadline is not None and monotonic() >= deadline):
+                    raise Full
+                sleep(POLL_INTERVAL)
+
+    def put_nowait(self, item):
+        self.put(item, block=False)
+
+    def get(self, block=True, timeout=None):
+        deadline = None if timeout is None else monotonic() + timeout
+        while True:
+            data = self.ring.get()
+            if data is not None:
+                return pickle.loads(data)
+            if not block:
+                raise Empty
+            if deadline is None:
+                sleep(POLL_INTERVAL)
+                continue
+            remaining = deadline - monotonic()
+            if remaining <= 0.0:
+                raise Empty
+            sleep(min(POLL_INTERVAL, remaining))
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def qsize(self):
+        """Return the number of bytes waiting, a rough measure of backlog."""
+        buf = self.ring.buf
+        return (
+            _COUNTER.unpack_from(buf, _TAIL_OFFSET)[0]
+            - _COUNTER.unpack_from(buf, _HEAD_OFFSET)[0])
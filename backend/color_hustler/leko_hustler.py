@@ -1,7 +1,5 @@
-from itertools import cycle
-
-from . import frame_clock
-from .controllable import Controllable, validate_string_constant
+from . import patterns
+from .controllable import Controllable
 from .rate import validate_positive
 
 
@@ -19,72 +17,73 @@ def validate_iterable(subvalidator):
     return validate
 
 
-def create_banks(n):
-    indices = list(range(n))
-
-    every = cycle([indices])
-    singles = cycle([[i] for i in range(n)])
-
-    evens = [i for i in indices if i % 2 == 0]
-    odds = [i for i in indices if i % 2 == 1]
-
-    two_values = cycle([evens, odds])
-
-    return {
-        LekoHustler.ALL: every,
-        LekoHustler.SINGLE: singles,
-        LekoHustler.TWO_VALUE: two_values,
-    }
+class LekoHustler(Controllable, patterns.PatternProperties):
+    """Control a collection of DMX-controllable fixtures.
 
-
-class LekoHustler(Controllable):
-    """Control a collection of DMX-controllable fixtures."""
-    ALL = 'all'
-    SINGLE = 'single'
-    TWO_VALUE = 'two_value'
+    Each trigger sets the easing targets of the controls in the next step of
+    the selected pattern; see patterns.  Sweeps use the fixture positions,
+    an (x, y) pair per fixture, which default to the fixtures laid out in a
+    row.
+    """
+    ALL = patterns.ALL
+    SINGLE = patterns.SINGLE
+    TWO_VALUE = patterns.TWO_VALUE
 
     parameters = dict(
         easing=validate_positive,
-        bank_name=validate_string_constant(
-            [ALL, SINGLE, TWO_VALUE], 'bank name'),
+        **patterns.PATTERN_PARAMETERS
     )
 
-    def __init__(self, param_gen, trig, fixtures):
+    telemetry = ('levels', 'step')
+
+    def __init__(self, param_gen, trig, fixtures, clock, positions=None, seed=None):
         self.easing = 0.1
+        self.clock = clock
         self.param_gen = param_gen
         self.controls = []
+        # position of the fixture each control belongs to
+        control_positions = []
 
         self.trig = trig
 
         self.fixtures = fixtures
 
-        for fixture in fixtures:
-            self.controls.extend(fixture.get_controls())
+        if positions is None:
+            positions = [(float(index), 0.0) for index in range(len(fixtures))]
+        for fixture, position in zip(fixtures, positions):
+            controls = fixture.get_controls()
+            self.controls.extend(controls)
+            control_positions.extend([tuple(position)] * len(controls))
 
         initial_value = param_gen.get()
 
         self.control_params = [Easer(initial_value) for _ in self.controls]
 
-        self.last_render = frame_clock.time()
+        self.last_render = clock.time()
 
-        self._bank_name = self.SINGLE
-        self.banks = create_banks(len(self.control_params))
-        self.bank = self.banks[self._bank_name]
+        self.init_pattern(control_positions, seed)
 
     @property
-    def bank_name(self):
-        return None
-
-    @bank_name.setter
-    def bank_name(self, bank_name):
-        self._bank_name = bank_name
-        self.bank = self.banks[bank_name]
+    def levels(self):
+        """The current eased value of every control."""
+        return [param.current for param in self.control_params]
+
+    def get_state(self):
+        return dict(
+            current=[param.current for param in self.control_params],
+            target=[param.target for param in self.control_params],
+            **self.get_pattern_state())
+
+    def set_state(self, state):
+        # the fixture list may have changed since the state was saved
+        for param, current, target in zip(
+                self.control_params, state['current'], state['target']):
+            param.current = current
+            param.target = target
+        self.set_pattern_state(state)
 
     def render(self, dmx_frame):
-        # we may need to switch banks
-        # FIXME this does NOT belong in the render method
-
-        now = frame_clock.time()
+        now = self.clock.time()
 
         dt = now - self.last_render
         self.last_render = now
@@ -92,10 +91,10 @@ class LekoHustler(Controllable):
         if self.trig.trigger():
             input_value = self.param_gen.get()
 
-            # If triggering, set new targets for the next pattern in the bank.
-            pattern = next(self.bank)
-            for i in pattern:
-                self.control_params[i].target = input_value
+            # set new targets for the next step of the pattern
+            control_params = self.control_params
+            for i in self.next_step():
+                control_params[i].target = input_value
 
         for control, param in zip(self.controls, self.control_params):
             value = param.ease(dt, self.easing)
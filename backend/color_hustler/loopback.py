@@ -0,0 +1,106 @@
+"""In-memory and local network stand-ins for the show's output devices."""
+import json
+import socket
+import time
+from array import array
+from threading import Lock, Thread
+
+DMX_UNIVERSE_SIZE = 512
+
+
+class MidiMessage:
+    """Stand-in for the mido Message types the organists send."""
+    _STATUS = dict(note_off=0x80, note_on=0x90, control_change=0xB0)
+
+    def __init__(self, type, channel=0, **data):
+        self.type = type
+        self.channel = channel
+        self.data = data
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__['data'][name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def bytes(self):
+        """Return the message as a list of midi bytes, like mido."""
+        status = self._STATUS[self.type] | self.channel
+        if self.type == 'control_change':
+            return [status, self.control, self.value]
+        return [status, self.note, self.velocity]
+
+
+class LoopbackMidiPort:
+    """Stand-in for a mido output port that keeps the messages sent to it.
+
+    Organists build their messages with message_type, by default a
+    MidiMessage so a show on this port never imports mido.  Pass mido's
+    Message for messages that are forwarded to a real port.
+    """
+    def __init__(self, message_type=MidiMessage):
+        self.message_type = message_type
+        self.messages = []
+
+    def send(self, message):
+        self.messages.append(message)
+
+    def take(self):
+        """Return and forget the messages sent since the last call."""
+        messages = self.messages
+        self.messages = []
+        return messages
+
+
+class LoopbackDmxPort:
+    """Stand-in for a pyenttec DMXConnection that counts rendered frames."""
+    def __init__(self, univ_size=DMX_UNIVERSE_SIZE):
+        self.dmx_frame = array('B', bytes(univ_size))
+        self.frames_rendered = 0
+
+    def render(self):
+        self.frames_rendered += 1
+
+
+class RecordingLampServer(Thread):
+    """Stand-in for lamp bridges that records the lamp colors sent to it.
+
+    Listens for LampTransport datagrams on a local UDP port; every lamp
+    update received is kept in commands as (time received, lamp, rgb).
+    Point any number of lamps at address.
+    """
+    def __init__(self, host='127.0.0.1', port=0):
+        Thread.__init__(self, daemon=True)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.settimeout(0.1)
+        self.address = self.sock.getsockname()
+        self.commands = []
+        self.datagrams = 0
+        self.lock = Lock()
+        self.running = True
+
+    def run(self):
+        while self.running:
+            try:
+                datagram = self.sock.recv(65536)
+            except socket.timeout:
+                continue
+            now = time.monotonic()
+            lamps = json.loads(datagram)['lamps']
+            with self.lock:
+                self.datagrams += 1
+                self.commands.extend(
+                    (now, lamp, tuple(rgb)) for lamp, rgb in lamps.items())
+
+    def take(self):
+        """Return and forget the commands received since the last call."""
+        with self.lock:
+            commands = self.commands
+            self.commands = []
+        return commands
+
+    def close(self):
+        self.running = False
+        self.join()
+        self.sock.close()
@@ -0,0 +1,192 @@
+"""Route any number of modulation sources to any number of destinations.
+
+A ModulationMatrix holds named sources, named destinations and a sparse
+weight for each route between them.  Once per frame every source is
+evaluated into a vector and every destination offset is computed with one
+sparse matrix-vector product; each destination is read through a
+MatrixOutput generator, which can stand in anywhere a generator is used:
+
+    matrix = ModulationMatrix(show.clock)
+    matrix.add_source('lfo', Waveform(show.clock))
+    hue = matrix.add_destination('hue0', source=h_gen)
+    show.register_entity(matrix, 'matrix')
+
+    show.handle_command(('matrix.route', ['lfo', 'hue0', 0.25]))
+"""
+from .controllable import Controllable
+from .param_gen import ParameterGenerator
+
+
+def validate_route(route):
+    try:
+        source, destination, weight = route
+    except (TypeError, ValueError):
+        raise ValueError(
+            "A route is [source, destination, weight]; got {}".format(route))
+    return str(source), str(destination), float(weight)
+
+
+def validate_routes(routes):
+    try:
+        return {
+            str(destination): {str(source): float(weight) for source, weight in row.items()}
+            for destination, row in routes.items()}
+    except (AttributeError, TypeError, ValueError):
+        raise ValueError(
+            "Routes are {{destination: {{source: weight}}}}; got {}".format(routes))
+
+
+class MatrixOutput(ParameterGenerator):
+    """One destination of a modulation matrix.
+
+    Produces the destination's offset, added to its source if it has one.
+    """
+    telemetry = ('value',)
+
+    def __init__(self, matrix, index, source=None):
+        self.matrix = matrix
+        self.index = index
+        self.source = source
+        self.value = 0.0
+
+    def get(self):
+        value = self.matrix.offsets()[self.index]
+        if self.source is not None:
+            value += self.source.get()
+        self.value = value
+        return value
+
+
+class ModulationMatrix(Controllable):
+    """A sparse matrix of weighted routes from sources to destinations.
+
+    Routes are kept as {destination: {source: weight}} and compiled into
+    compressed sparse rows whenever they change, so a frame costs one get
+    per source and one multiply-add per route, however many destinations
+    share a source.
+    """
+    parameters = dict(
+        route=validate_route,
+        routes=validate_routes,
+        clear=bool,
+    )
+
+    actions = frozenset(['route', 'clear'])
+
+    telemetry = ('inputs', 'outputs')
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.source_names = []
+        self.sources = []
+        self.destination_names = []
+        self._routes = {}
+
+        # compressed sparse rows: the routes into destination d are
+        # _indices[_indptr[d]:_indptr[d + 1]] with matching _weights
+        self._indptr = [0]
+        self._indices = []
+        self._weights = []
+
+        self.inputs = []
+        self.outputs = []
+        self._evaluated_at = None
+
+    def add_source(self, name, generator):
+        if name in self.source_names:
+            raise ValueError("Duplicate matrix source: {}".format(name))
+        self.source_names.append(name)
+        self.sources.append(generator)
+        self._compile()
+
+    def add_destination(self, name, source=None):
+        """Add a destination and return the MatrixOutput producing it."""
+        if name in self.destination_names:
+            raise ValueError("Duplicate matrix destination: {}".format(name))
+        self.destination_names.append(name)
+        self._compile()
+        return MatrixOutput(self, len(self.destination_names) - 1, source)
+
+    @property
+    def routes(self):
+        return {destination: dict(row) for destination, row in self._routes.items()}
+
+    @routes.setter
+    def routes(self, routes):
+        for destination, row in routes.items():
+            for source in row:
+                self._check_route(source, destination)
+        self._routes = {
+            destination: {source: weight for source, weight in row.items() if weight}
+            for destination, row in routes.items()}
+        self._compile()
+
+    @property
+    def route(self):
+        return None
+
+    @route.setter
+    def route(self, route):
+        """Set the weight of one route; a weight of zero removes it."""
+        source, destination, weight = route
+        self._check_route(source, destination)
+        row = self._routes.setdefault(destination, {})
+        if weight:
+            row[source] = weight
+        else:
+            row.pop(source, None)
+        self._compile()
+
+    @property
+    def clear(self):
+        return None
+
+    @clear.setter
+    def clear(self, _):
+        self._routes = {}
+        self._compile()
+
+    def _check_route(self, source, destination):
+        if source not in self.source_names:
+            raise ValueError("No matrix source named {}.".format(source))
+        if destination not in self.destination_names:
+            raise ValueError("No matrix destination named {}.".format(destination))
+
+    def _compile(self):
+        source_index = {name: index for index, name in enumerate(self.source_names)}
+        indptr = [0]
+        indices = []
+        weights = []
+        for destination in self.destination_names:
+            for source, weight in self._routes.get(destination, {}).items():
+                indices.append(source_index[source])
+                weights.append(weight)
+            indptr.append(len(indices))
+        self._indptr = indptr
+        self._indices = indices
+        self._weights = weights
+        self.outputs = [0.0] * len(self.destination_names)
+        self._evaluated_at = None
+
+    def offsets(self):
+        """Return the offset of every destination for the current frame."""
+        now = self.clock.time()
+        if now == self._evaluated_at:
+            return self.outputs
+
+        inputs = [source.get() for source in self.sources]
+        indptr = self._indptr
+        indices = self._indices
+        weights = self._weights
+        # a new list each frame, so telemetry sees it change
+        outputs = []
+        for row in range(len(self.destination_names)):
+            total = 0.0
+            for k in range(indptr[row], indptr[row + 1]):
+                total += weights[k] * inputs[indices[k]]
+            outputs.append(total)
+
+        self.inputs = inputs
+        self.outputs = outputs
+        self._evaluated_at = now
+        return outputs
@@ -0,0 +1,113 @@
+"""Render a show as fast as possible against a virtual clock.
+
+Output is written to two flat binary files that can be loaded directly with
+numpy.fromfile:
+    <path>.dmx: every DMX frame in order, dtype uint8, reshape(-1, 512)
+    <path>.midi: every MIDI message, dtype MIDI_EVENT_DTYPE
+"""
+import argparse
+import struct
+from multiprocessing import Pool
+from time import monotonic
+
+from . import create_show
+from .frame_clock import FrameClock, VirtualClock
+from .loopback import LoopbackDmxPort, LoopbackMidiPort
+
+# frame number the message was sent on, then the three message bytes
+MIDI_EVENT = struct.Struct('<IBBB')
+MIDI_EVENT_DTYPE = [('frame', '<u4'), ('status', 'u1'), ('data1', 'u1'), ('data2', 'u1')]
+
+
+def render_offline(
+        duration,
+        path,
+        framerate=60.0,
+        seed=0,
+        rotos=tuple(),
+        dimmers=tuple(),
+        playback=None):
+    """Render duration seconds of the standard show to files at path.
+
+    DMX output is only rendered if fixtures are provided.  If playback is the
+    path of a command log, it is played back from the first frame.
+
+    Return the number of frames rendered.
+    """
+    clock = VirtualClock()
+    midi_port = LoopbackMidiPort()
+    dmx_port = LoopbackDmxPort() if rotos or dimmers else None
+    show = create_show(
+        midi_port=midi_port,
+        dmx_port=dmx_port,
+        rotos=rotos,
+        dimmers=dimmers,
+        framerate=framerate,
+        seed=seed,
+        clock=FrameClock(clock),
+    )
+    if playback is not None:
+        show.start_playback(playback)
+
+    frame_count = int(duration * framerate)
+    dt = 1.0 / framerate
+
+    with open(path + '.dmx', 'wb') as dmx_out, open(path + '.midi', 'wb') as midi_out:
+        for _ in range(frame_count):
+            clock.advance(dt)
+            show.render()
+
+            for message in midi_port.take():
+                midi_out.write(MIDI_EVENT.pack(show.frame, *message.bytes()))
+            if dmx_port is not None:
+                dmx_out.write(dmx_port.dmx_frame)
+    return frame_count
+
+
+def _render_job(job):
+    return render_offline(**job)
+
+
+def render_many(jobs, processes=None):
+    """Render many independent shows in parallel worker processes.
+
+    Each job is a dict of keyword arguments for render_offline and must give
+    every show its own output path.  Every show runs on its own virtual clock.
+    Return the frame count of each job, in order.
+    """
+    with Pool(processes) as pool:
+        return pool.map(_render_job, jobs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('duration', type=float, help="seconds of show to render")
+    parser.add_argument(
+        'path', nargs='+', help="output path, without extension; pass several "
+        "to render a batch with consecutive seeds in parallel")
+    parser.add_argument('--framerate', type=float, default=60.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--playback', help="command log to play back")
+    args = parser.parse_args()
+
+    jobs = [
+        dict(
+            duration=args.duration,
+            path=path,
+            framerate=args.framerate,
+            seed=args.seed + i,
+            playback=args.playback)
+        for i, path in enumerate(args.path)]
+
+    start = monotonic()
+    if len(jobs) == 1:
+        frames = [render_offline(**jobs[0])]
+    else:
+        frames = render_many(jobs)
+    elapsed = monotonic() - start
+    print("Rendered {} frames in {:.2f} s ({:.0f}x real time).".format(
+        sum(frames), elapsed, args.duration * len(jobs) / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -5,32 +5,48 @@ Velocity = intensity
 Hue = midi note, use 0 to 127 for maximum expression (still not a lot of colors...)
 Saturation: set as a control change before sending the note
 """
-from mido import Message
-
 # control mappings
 CC_SAT = 11
 
+def midi_message_type(midi_port):
+    """Return the message type to build midi messages for midi_port with.
+
+    Ports that build their own, such as LoopbackMidiPort, name it as
+    message_type; anything else is taken to be a mido port.
+    """
+    message_type = getattr(midi_port, 'message_type', None)
+    if message_type is None:
+        # imported here so the package loads without mido
+        from mido import Message as message_type
+    return message_type
+
 def unit_float_to_7bit(number):
     """Convert a float on the range [0,1] to an int on the range [0,127]."""
     return min(int(number*128), 127)
 
 class ColorOrganist:
     """Takes a stream of colors and sends them to a LD50 color organ."""
+    telemetry = ('color',)
+
     def __init__(self, ctrl_channel, note_trig, col_gen):
         self.ctrl_channel = ctrl_channel
         self.note_trig = note_trig
         self.col_gen = col_gen
+        # HSV coordinates of the last color played
+        self.color = None
 
     def play(self, midi_port):
         """Play the color organ if the moment is right."""
         # should this organist play a note?
         if not self.note_trig.trigger():
             return
+        Message = midi_message_type(midi_port)
 
         color = self.col_gen.get()
 
         # convert the color to HSV
         col_hsv = color.in_hsv()
+        self.color = col_hsv.coordinates
 
         # color organ hue is offset by 0.5 to put red at the center of the keyboard
         note = unit_float_to_7bit((col_hsv.hue_hsv + 0.5) % 1.0)
@@ -0,0 +1,241 @@
+"""Render independent parts of a show in parallel worker processes.
+
+The organists and fixture hustlers of a show are its render units.  Units
+that reach a common generator, directly or through Modulator sources,
+modulation generators, color generators and triggers, must render in the
+same process; units that share nothing can render side by side.  partition
+finds the independent groups, and ParallelRenderer spreads them over forked
+worker processes:
+
+    each frame the show sends every worker the frame time and any parameter
+    changes for its entities, each worker renders its units, hustlers writing
+    straight into a shared memory universe, and the show waits for every
+    worker to report back before sending the collected midi and the universe.
+
+Frame time is then set by the slowest worker rather than the total.
+Parameter writes made through show.dispatch, by commands, presets or state
+restores, are forwarded to the owning worker.  Runtime state such as
+telemetry values lives in the workers, so the show's own copies of the
+entities go stale.
+"""
+import multiprocessing
+from multiprocessing import shared_memory
+
+from .frame_clock import FrameClock, LiveClock, VirtualClock
+from .loopback import LoopbackMidiPort
+from .organ import midi_message_type
+
+# objects the render units share without coupling their output
+_SHARED_TYPES = (FrameClock, LiveClock, VirtualClock)
+
+
+def render_units(show):
+    """Return the show's render units as a list of (kind, object).
+
+    Organists are ordered by midi channel so output order is stable.
+    """
+    units = [
+        ('organist', organist)
+        for organist in show.ordered_organists()]
+    for hustler in (show.gobo_hustler, show.dimmer_hustler, show.pixel_hustler):
+        if hustler is not None:
+            units.append(('hustler', hustler))
+    return units
+
+
+def reachable(obj):
+    """Return the ids of every show object reachable from obj.
+
+    Attributes are followed into objects defined in this package and into
+    lists, tuples and dicts; clocks are shared by everything and skipped.
+    """
+    seen = set()
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, (list, tuple)):
+            stack.extend(obj)
+            continue
+        if isinstance(obj, dict):
+            stack.extend(obj.values())
+            continue
+        if (not type(obj).__module__.startswith(__package__)
+                or isinstance(obj, _SHARED_TYPES)
+                or id(obj) in seen):
+            continue
+        seen.add(id(obj))
+        stack.extend(vars(obj).values())
+    return seen
+
+
+def partition(units):
+    """Group unit indices so units sharing any object are in the same group.
+
+    Return a list of (group, weight) where weight is the number of objects
+    the group renders, a rough measure of its cost.
+    """
+    parent = list(range(len(units)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    owner = {}
+    weights = [0] * len(units)
+    for index, (_, unit) in enumerate(units):
+        objects = reachable(unit)
+        weights[index] = len(objects)
+        for obj_id in objects:
+            other = owner.setdefault(obj_id, index)
+            if other != index:
+                parent[find(index)] = find(other)
+
+    groups = {}
+    for index in range(len(units)):
+        groups.setdefault(find(index), []).append(index)
+    return [
+        (group, sum(weights[index] for index in group))
+        for group in groups.values()]
+
+
+def assign(groups, workers):
+    """Spread groups over workers, heaviest first onto the lightest worker.
+
+    Return a list of unit indices for each worker, dropping empty workers.
+    """
+    bins = [([], 0) for _ in range(workers)]
+    for group, weight in sorted(groups, key=lambda g: g[1], reverse=True):
+        lightest = min(range(workers), key=lambda i: bins[i][1])
+        indices, total = bins[lightest]
+        bins[lightest] = (indices + group, total + weight)
+    return [sorted(indices) for indices, _ in bins if indices]
+
+
+def _serve(conn, show, units, universe):
+    """Worker process loop: render units on request until told to stop."""
+    source = VirtualClock()
+    show.clock.source = source
+    # build messages the show's own port can send
+    midi_port = LoopbackMidiPort(midi_message_type(show.midi_port))
+    organists = [unit for kind, unit in units if kind == 'organist']
+    hustlers = [unit for kind, unit in units if kind == 'hustler']
+    # lamp organs send from the worker that plays them
+    transports = {
+        id(organist.transport): organist.transport
+        for organist in organists if hasattr(organist, 'transport')}
+
+    while True:
+        request = conn.recv()
+        if request is None:
+            break
+        now, writes = request
+        for cmd_type, value in writes:
+            show.dispatch[cmd_type][1](value)
+
+        source.now = now
+        show.clock.tick()
+        for organist in organists:
+            organist.play(midi_port)
+        for hustler in hustlers:
+            hustler.render(universe)
+        for transport in transports.values():
+            transport.flush()
+        conn.send((
+            midi_port.take(),
+            [(organist.ctrl_channel, organist.color) for organist in organists]))
+    conn.close()
+
+
+class ParallelRenderer:
+    """Render a show's independent groups of units in worker processes.
+
+    Workers are forked from the show, so create the renderer once the show is
+    fully built and ideally before starting other threads.  Units and
+    entities added afterwards are not rendered in parallel.
+    """
+    def __init__(self, show, processes=None):
+        self.show = show
+        units = render_units(show)
+        workers = assign(
+            partition(units), processes or multiprocessing.cpu_count())
+
+        universe = show.dmx_port.dmx_frame if show.dmx_port is not None else b''
+        self.shm = shared_memory.SharedMemory(create=True, size=max(len(universe), 1))
+        self.universe = self.shm.buf[:len(universe)]
+        self.universe[:] = universe
+        self.organists = {
+            organist.ctrl_channel: organist
+            for kind, organist in units if kind == 'organist'}
+
+        context = multiprocessing.get_context('fork')
+        self.conns = []
+        self.processes = []
+        # entity name to the index of the worker that owns it
+        owners = {}
+        for worker_index, indices in enumerate(workers):
+            worker_units = [units[index] for index in indices]
+            conn, child_conn = context.Pipe()
+            process = context.Process(
+                target=_serve,
+                args=(child_conn, show, worker_units, self.universe),
+                daemon=True)
+            process.start()
+            child_conn.close()
+            self.conns.append(conn)
+            self.processes.append(process)
+
+            objects = set()
+            for _, unit in worker_units:
+                objects |= reachable(unit)
+            for name, entity in show.entities.items():
+                if id(entity) in objects:
+                    owners[name] = worker_index
+
+        # parameter writes waiting for the next frame, per worker
+        self.writes = [[] for _ in self.conns]
+        # dispatch entries replaced by forwarding ones, restored on close
+        self.replaced = {}
+        for cmd_type, (name, setter) in list(show.dispatch.items()):
+            if name in owners:
+                self.replaced[cmd_type] = (name, setter)
+                show.dispatch[cmd_type] = (
+                    name, self._forwarding(cmd_type, setter, self.writes[owners[name]]))
+        show._pattern_cache.clear()
+
+    def _forwarding(self, cmd_type, setter, writes):
+        def set_parameter(value):
+            setter(value)
+            writes.append((cmd_type, value))
+        return set_parameter
+
+    def render(self, midi_port, dmx_frame):
+        """Render one frame across the workers and wait for all of them."""
+        now = self.show.clock.time()
+        for conn, writes in zip(self.conns, self.writes):
+            conn.send((now, writes[:]))
+            del writes[:]
+
+        for conn in self.conns:
+            messages, colors = conn.recv()
+            for message in messages:
+                midi_port.send(message)
+            for channel, color in colors:
+                self.organists[channel].color = color
+
+        if dmx_frame is not None:
+            memoryview(dmx_frame)[:] = self.universe
+
+    def close(self):
+        """Stop the workers; the show renders its units itself again."""
+        self.show.dispatch.update(self.replaced)
+        self.show._pattern_cache.clear()
+        for conn in self.conns:
+            conn.send(None)
+            conn.close()
+        for process in self.processes:
+            process.join()
+        self.universe.release()
+        self.shm.close()
+        self.shm.unlink()
@@ -1,8 +1,8 @@
 import math
+from bisect import bisect_right
 from random import Random
-from . import frame_clock
 from .controllable import Controllable, validate_string_constant
-from .rate import RateProperties, Rate
+from .rate import RateProperties, Rate, validate_positive
 
 # --- numeric helper functions ---
 
@@ -121,10 +121,13 @@ class ConstantList(ParameterGenerator):
     """Choose from a list of constant values."""
     parameters = dict(values=validate_constant_list, random=bool)
 
+    telemetry = ('value', 'index')
+
     def __init__(self, values, random=False, seed=None):
         self.values = values
         self.random = random
         self.index = 0
+        self.value = values[0]
         self.rand_gen = Random()
         if seed is not None:
             self.rand_gen.seed(seed)
@@ -132,10 +135,20 @@ class ConstantList(ParameterGenerator):
     def get(self):
         if self.random:
             index = self.rand_gen.randint(0, len(self.values)-1)
-            return self.values[index]
+            self.value = self.values[index]
+            return self.value
 
         self.index = (self.index + 1) % len(self.values)
-        return self.values[self.index]
+        self.value = self.values[self.index]
+        return self.value
+
+    def get_state(self):
+        return dict(index=self.index, value=self.value, rand=self.rand_gen.getstate())
+
+    def set_state(self, state):
+        self.index = state['index']
+        self.value = state['value']
+        self.rand_gen.setstate(state['rand'])
 
 
 class Noise(ParameterGenerator):
@@ -147,6 +160,9 @@ class Noise(ParameterGenerator):
         mode=validate_string_constant([UNIFORM, GAUSSIAN], "noise mode"),
         center=float,
         width=float)
+
+    telemetry = ('value',)
+
     def __init__(self, mode, center, width, seed=None):
         """
         Args:
@@ -158,18 +174,28 @@ class Noise(ParameterGenerator):
         self.mode = mode
         self.center = center
         self.width = width
+        self.value = center
         self._gen = Random()
         if seed is not None:
             self._gen.seed(seed)
 
     def get(self):
         if self.mode == self.GAUSSIAN:
-            return self._gen.gauss(self.center, self.width)
+            self.value = self._gen.gauss(self.center, self.width)
+            return self.value
         if self.mode == self.UNIFORM:
-            return self._gen.uniform(
+            self.value = self._gen.uniform(
                 self.center - self.width, self.center + self.width)
+            return self.value
         raise ValueError("Unknown noise mode: {}".format(self.mode))
 
+    def get_state(self):
+        return dict(value=self.value, rand=self._gen.getstate())
+
+    def set_state(self, state):
+        self.value = state['value']
+        self._gen.setstate(state['rand'])
+
 PI = math.pi
 HALF_PI = math.pi / 2.0
 TWOPI = 2*math.pi
@@ -289,11 +315,18 @@ class Waveform(ParameterGenerator, RateProperties):
         amplitude=float,
     )
 
-    def __init__(self, rate=None, waveform=SINE):
+    actions = frozenset(['reset'])
+
+    aliases = frozenset(['period', 'hz'])
+
+    telemetry = ('value', 'phase')
+
+    def __init__(self, clock, rate=None, waveform=SINE):
         """Create a function generator with a specified function.
 
         Internally keeps track of phase on the range [0.0, 1.0)
         """
+        self.clock = clock
         self.pulse = False
         self.smoothing = 0.0
         self.duty_cycle = 1.0
@@ -305,7 +338,12 @@ class Waveform(ParameterGenerator, RateProperties):
         self._rate = rate
         self.waveform = waveform
         self._phase = 0.0
-        self._last_update = frame_clock.time()
+        self._last_update = clock.time()
+        self.value = 0.0
+
+    @property
+    def phase(self):
+        return self._phase
 
     @property
     def reset(self):
@@ -321,13 +359,276 @@ class Waveform(ParameterGenerator, RateProperties):
         self._last_update = now
 
     def get(self):
-        now = frame_clock.time()
+        now = self.clock.time()
         if now != self._last_update:
             self._update_phase(now)
 
         func = self._funcs[self.waveform]
         val = func(self._phase, self.smoothing, self.duty_cycle, self.pulse)
-        return self.amplitude * val
+        self.value = self.amplitude * val
+        return self.value
+
+    def get_state(self):
+        return dict(phase=self._phase, value=self.value)
+
+    def set_state(self, state):
+        self._phase = state['phase']
+        self.value = state['value']
+        self._last_update = self.clock.time()
+
+def validate_octaves(value):
+    value = int(value)
+    if value < 1:
+        raise ValueError("Must have at least one octave; got {}".format(value))
+    return value
+
+def _fade(t):
+    """Perlin's quintic fade curve, smooth through the second derivative."""
+    return t * t * t * (t * (t * 6.0 - 15.0) + 10.0)
+
+class SmoothNoise(ParameterGenerator, RateProperties):
+    """Generate temporally coherent noise that drifts smoothly over time.
+
+    Sums octaves of one-dimensional gradient noise read at the frame clock
+    time; rate sets how many lattice points the lowest octave crosses per
+    second, each further octave runs twice as fast at persistence times the
+    amplitude.  Output wanders over roughly center +/- width.
+
+    Gradients are looked up through a seeded permutation table, hashed with a
+    stream number, so get_many can produce independent streams, one per
+    fixture, from the same generator.
+    """
+    TABLE_SIZE = 256
+
+    parameters = dict(
+        period=validate_positive,
+        hz=validate_positive,
+        bpm=validate_positive,
+        octaves=validate_octaves,
+        persistence=float_unit,
+        center=float,
+        width=float)
+
+    aliases = frozenset(['period', 'hz'])
+
+    telemetry = ('value',)
+
+    def __init__(self, clock, center, width, rate=None, octaves=1, persistence=0.5,
+                 seed=None):
+        self.clock = clock
+        self.center = center
+        self.width = width
+        self.octaves = octaves
+        self.persistence = persistence
+
+        if rate is None:
+            rate = Rate(hz=1.0)
+        self._rate = rate
+
+        gen = Random()
+        if seed is not None:
+            gen.seed(seed)
+        perm = list(range(self.TABLE_SIZE))
+        gen.shuffle(perm)
+        self._perm = perm
+        self._grads = [gen.uniform(-1.0, 1.0) for _ in range(self.TABLE_SIZE)]
+
+        self._position = 0.0
+        self._last_update = clock.time()
+        self.value = center
+
+    def _update_position(self):
+        now = self.clock.time()
+        if now != self._last_update:
+            self._position += (now - self._last_update) * self.hz
+            self._last_update = now
+        return self._position
+
+    def _noise(self, position, stream):
+        """Return the summed octaves of noise stream at position, on [-1, 1]."""
+        perm = self._perm
+        grads = self._grads
+        mask = self.TABLE_SIZE - 1
+        total = 0.0
+        norm = 0.0
+        amplitude = 1.0
+        x = position
+        for octave in range(self.octaves):
+            # shift each octave so their lattice points don't line up
+            xo = x + 0.31 * octave
+            i = math.floor(xo)
+            f = xo - i
+            g0 = grads[perm[(perm[i & mask] + stream) & mask]] * f
+            g1 = grads[perm[(perm[(i + 1) & mask] + stream) & mask]] * (f - 1.0)
+            total += amplitude * (g0 + _fade(f) * (g1 - g0))
+            norm += amplitude
+            amplitude *= self.persistence
+            x *= 2.0
+        # one octave of 1D gradient noise stays within [-0.5, 0.5]
+        return 2.0 * total / norm
+
+    def get(self):
+        position = self._update_position()
+        self.value = self.center + self.width * self._noise(position, 0)
+        return self.value
+
+    def get_many(self, count):
+        """Return the current value of count independent noise streams.
+
+        Stream 0 is the stream returned by get.  Streams repeat after
+        TABLE_SIZE.
+        """
+        position = self._update_position()
+        center = self.center
+        width = self.width
+        noise = self._noise
+        return [center + width * noise(position, stream) for stream in range(count)]
+
+    def get_state(self):
+        return dict(position=self._position, value=self.value)
+
+    def set_state(self, state):
+        self._position = state['position']
+        self.value = state['value']
+        self._last_update = self.clock.time()
+
+def validate_durations(items):
+    durations = validate_constant_list(items)
+    if any(duration <= 0.0 for duration in durations):
+        raise ValueError("Step durations must be positive; got {}".format(items))
+    return durations
+
+class StepSequencer(ParameterGenerator, RateProperties):
+    """Step through a sequence of values in time with a tempo.
+
+    Each step holds its value for its duration in beats; durations are
+    repeated if there are fewer of them than values.  Glide is the fraction
+    of each step spent sliding from the previous step's value, and swing
+    delays every second step by up to half its own duration.
+
+    Whenever the sequence changes it is compiled into the start time of
+    every step, so finding the current step is a binary search however long
+    the sequence is.
+    """
+    parameters = dict(
+        values=validate_constant_list,
+        durations=validate_durations,
+        glide=float_unit,
+        swing=float_unit,
+        period=validate_positive,
+        hz=validate_positive,
+        bpm=validate_positive,
+        reset=bool,
+    )
+
+    actions = frozenset(['reset'])
+
+    aliases = frozenset(['period', 'hz'])
+
+    telemetry = ('value', 'step')
+
+    def __init__(self, clock, values, durations=(1.0,), rate=None, glide=0.0, swing=0.0):
+        self.clock = clock
+        if rate is None:
+            rate = Rate(bpm=120.0)
+        self._rate = rate
+        self.glide = glide
+        self._values = validate_constant_list(values)
+        self._durations = validate_durations(durations)
+        self._swing = swing
+        self._compile()
+
+        # position in beats
+        self._position = 0.0
+        self._last_update = clock.time()
+        self.step = 0
+        self.value = self._values[0]
+
+    def _compile(self):
+        values = self._values
+        durations = [
+            self._durations[index % len(self._durations)] for index in range(len(values))]
+        starts = []
+        start = 0.0
+        for index, duration in enumerate(durations):
+            if index % 2:
+                # swing pushes the offbeat later, shortening it
+                starts.append(start + 0.5 * self._swing * duration)
+            else:
+                starts.append(start)
+            start += duration
+        self._starts = starts
+        # each step ends where the next begins
+        self._ends = starts[1:] + [start]
+        self._length = start
+
+    @property
+    def values(self):
+        return self._values
+
+    @values.setter
+    def values(self, values):
+        self._values = values
+        self._compile()
+
+    @property
+    def durations(self):
+        return self._durations
+
+    @durations.setter
+    def durations(self, durations):
+        self._durations = durations
+        self._compile()
+
+    @property
+    def swing(self):
+        return self._swing
+
+    @swing.setter
+    def swing(self, swing):
+        self._swing = swing
+        self._compile()
+
+    @property
+    def reset(self):
+        return None
+
+    @reset.setter
+    def reset(self, _):
+        self._position = 0.0
+
+    def get(self):
+        now = self.clock.time()
+        if now != self._last_update:
+            self._position = (
+                self._position + (now - self._last_update) * self.hz) % self._length
+            self._last_update = now
+
+        position = self._position
+        starts = self._starts
+        # before the first, swung, step start we are still in the last step
+        step = bisect_right(starts, position) - 1
+        self.step = step % len(starts)
+        value = self._values[self.step]
+
+        if self.glide > 0.0:
+            start = starts[self.step]
+            elapsed = (position - start) % self._length
+            glide_time = self.glide * (self._ends[self.step] - start)
+            if elapsed < glide_time:
+                previous = self._values[self.step - 1]
+                value = previous + (value - previous) * (elapsed / glide_time)
+
+        self.value = value
+        return value
+
+    def get_state(self):
+        return dict(position=self._position, value=self.value)
+
+    def set_state(self, state):
+        self._position = state['position']
+        self.value = state['value']
+        self._last_update = self.clock.time()
 
 # --- modulators ---
 
@@ -340,23 +641,34 @@ class Modulator(ParameterGenerator):
     parameters = dict(
         operation=validate_string_constant([ADD, SUBTRACT, MULTIPLY], "modulation mode"))
 
+    telemetry = ('value',)
+
     def __init__(self, source, modulation_gen, operation=ADD):
         self.source = source
         self.modulation_gen = modulation_gen
         self.operation = operation
+        self.value = 0.0
 
     def get(self):
         input_val = self.source.get()
         mod_val = self.modulation_gen.get()
 
         if self.operation == self.ADD:
-            return input_val + mod_val
-        if self.operation == self.SUBTRACT:
-            return input_val - mod_val
-        if self.operation == self.MULTIPLY:
-            return input_val * mod_val
+            self.value = input_val + mod_val
+        elif self.operation == self.SUBTRACT:
+            self.value = input_val - mod_val
+        elif self.operation == self.MULTIPLY:
+            self.value = input_val * mod_val
+        else:
+            raise ValueError(
+                "Unknown modulation operation: {}".format(self.operation))
+        return self.value
+
+    def get_state(self):
+        return dict(value=self.value)
 
-        raise ValueError("Unknown modulation operation: {}".format(self.operation))
+    def set_state(self, state):
+        self.value = state['value']
 
 
 class BrickwallLimiter(ParameterGenerator):
@@ -0,0 +1,203 @@
+"""Patterns choosing which fixture controls each trigger of a hustler sets.
+
+A compiled pattern is a tuple of steps, each a tuple of control indices.
+Patterns depend only on their inputs, so they are compiled once and cached.
+"""
+import math
+from functools import lru_cache
+from random import Random
+
+from .controllable import validate_string_constant
+
+ALL = 'all'
+SINGLE = 'single'
+TWO_VALUE = 'two_value'
+BOUNCE = 'bounce'
+GROUPS = 'groups'
+RANDOM = 'random'
+SWEEP = 'sweep'
+
+PATTERNS = (ALL, SINGLE, TWO_VALUE, BOUNCE, GROUPS, RANDOM, SWEEP)
+
+
+@lru_cache(maxsize=None)
+def compile_pattern(name, count, group_size=2):
+    """Compile a pattern that depends only on the number of controls.
+
+    all: every control at once
+    single: a chase through the controls one at a time
+    two_value: even controls, then odd controls
+    bounce: a chase back and forth
+    groups: a chase through consecutive groups of group_size controls
+    """
+    indices = range(count)
+    if name == ALL:
+        return (tuple(indices),) if count else ()
+    if name == SINGLE:
+        return tuple((i,) for i in indices)
+    if name == TWO_VALUE:
+        return tuple(
+            step for step in (tuple(indices[0::2]), tuple(indices[1::2])) if step)
+    if name == BOUNCE:
+        return tuple((i,) for i in list(indices) + list(range(count - 2, 0, -1)))
+    if name == GROUPS:
+        return tuple(
+            tuple(range(start, min(start + group_size, count)))
+            for start in range(0, count, group_size))
+    raise ValueError("{} is not a fixed pattern.".format(name))
+
+
+# angles are free-form, so a dragged angle would otherwise cache every value
+# it passes through; this keeps the recent angles of a few hustlers
+@lru_cache(maxsize=32)
+def compile_sweep(positions, angle, steps):
+    """Compile a sweep across positions in the direction of angle in degrees.
+
+    positions holds an (x, y) tuple for every control.  The controls are
+    split into steps bands perpendicular to the direction of travel; bands
+    with no controls in them are skipped.
+    """
+    if not positions:
+        return ()
+    radians = math.radians(angle)
+    dx, dy = math.cos(radians), math.sin(radians)
+    distances = [x * dx + y * dy for x, y in positions]
+    start = min(distances)
+    extent = max(distances) - start
+
+    bands = [[] for _ in range(steps)]
+    for index, distance in enumerate(distances):
+        if extent == 0.0:
+            band = 0
+        else:
+            band = min(int((distance - start) / extent * steps), steps - 1)
+        bands[band].append(index)
+    return tuple(tuple(band) for band in bands if band)
+
+
+def random_order(count, rand, previous=None):
+    """Return every control once in a random order, as single-control steps.
+
+    If given, previous is the control set last, which will not come first,
+    so no control is set twice in a row across cycles.
+    """
+    order = list(range(count))
+    rand.shuffle(order)
+    if count > 1 and order[0] == previous:
+        swap = rand.randrange(1, count)
+        order[0], order[swap] = order[swap], order[0]
+    return tuple((i,) for i in order)
+
+
+def validate_count(value):
+    value = int(value)
+    if value < 1:
+        raise ValueError("Must be at least 1; got {}".format(value))
+    return value
+
+
+# parameters of PatternProperties, for classes using it to add to their own
+PATTERN_PARAMETERS = dict(
+    bank_name=validate_string_constant(PATTERNS, 'bank name'),
+    group_size=validate_count,
+    sweep_angle=float,
+    sweep_steps=validate_count,
+)
+
+
+class PatternProperties:
+    """Mixin stepping through a selectable pattern of targets.
+
+    Call init_pattern with the (x, y) position of every target, then
+    next_step for the target indices of each step.  The step count carries
+    on across pattern changes, so switching patterns doesn't restart a
+    chase.
+    """
+    def init_pattern(self, positions, seed=None):
+        # position of every target, used by sweeps
+        self.pattern_positions = tuple(positions)
+
+        # number of pattern steps taken, whatever the pattern
+        self.step = 0
+        self.rand_gen = Random()
+        if seed is not None:
+            self.rand_gen.seed(seed)
+        self._last_index = None
+
+        self._bank_name = SINGLE
+        self._group_size = 2
+        self._sweep_angle = 0.0
+        self._sweep_steps = 8
+        self._compile()
+
+    def _compile(self):
+        count = len(self.pattern_positions)
+        if self._bank_name == SWEEP:
+            self.pattern = compile_sweep(
+                self.pattern_positions, self._sweep_angle, self._sweep_steps)
+        elif self._bank_name == RANDOM:
+            self.pattern = random_order(count, self.rand_gen, self._last_index)
+        else:
+            self.pattern = compile_pattern(self._bank_name, count, self._group_size)
+
+    @property
+    def bank_name(self):
+        return self._bank_name
+
+    @bank_name.setter
+    def bank_name(self, bank_name):
+        if bank_name != self._bank_name:
+            self._bank_name = bank_name
+            self._compile()
+
+    @property
+    def group_size(self):
+        return self._group_size
+
+    @group_size.setter
+    def group_size(self, group_size):
+        self._group_size = group_size
+        self._compile()
+
+    @property
+    def sweep_angle(self):
+        return self._sweep_angle
+
+    @sweep_angle.setter
+    def sweep_angle(self, sweep_angle):
+        self._sweep_angle = sweep_angle
+        self._compile()
+
+    @property
+    def sweep_steps(self):
+        return self._sweep_steps
+
+    @sweep_steps.setter
+    def sweep_steps(self, sweep_steps):
+        self._sweep_steps = sweep_steps
+        self._compile()
+
+    def get_pattern_state(self):
+        return dict(step=self.step, rand=self.rand_gen.getstate())
+
+    def set_pattern_state(self, state):
+        # snapshots from before patterns kept their place
+        self.step = state.get('step', 0)
+        if 'rand' in state:
+            self.rand_gen.setstate(state['rand'])
+
+    def next_step(self):
+        """Return the target indices of the next step of the pattern."""
+        pattern = self.pattern
+        if not pattern:
+            return ()
+        index = self.step % len(pattern)
+        if index == 0 and self._bank_name == RANDOM and self.step:
+            # a fresh order for every pass through the targets
+            self._compile()
+            pattern = self.pattern
+        self.step += 1
+        indices = pattern[index]
+        if indices:
+            self._last_index = indices[-1]
+        return indices
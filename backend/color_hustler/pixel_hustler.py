@@ -0,0 +1,240 @@
+"""Drive RGB and RGBW pixel fixtures from a color generator.
+
+A PixelHustler steps through a pattern like a LekoHustler, but its targets
+are whole pixels and their values colors.  Each trigger draws spread colors
+from the generator's get_many and lays them across the pixels of the next
+step as an Oklab gradient, so a step of a thousand pixels costs a handful
+of generated colors rather than a thousand.  Colors are eased in Oklab too,
+where equal distances look like equal changes, so a fade runs at an even
+pace whatever the colors at either end.
+
+Every frame the pixels still easing are converted from Oklab to linear
+light, quantized to LUT_SIZE levels, split into a white component for RGBW
+pixels, and looked up in their fixture's gamma table before being written
+straight into the universe.  Pixels that have reached their target aren't
+touched, so a settled rig costs next to nothing.
+"""
+from functools import lru_cache
+from math import sqrt
+
+from . import patterns
+from .color import linear_rgb_to_oklab, oklab_to_linear_rgb, srgb_to_linear
+from .controllable import Controllable
+from .loopback import DMX_UNIVERSE_SIZE
+from .patterns import validate_count
+from .rate import validate_positive
+
+# number of linear light levels in a gamma table
+LUT_SIZE = 4096
+_LUT_MAX = LUT_SIZE - 1
+
+
+def validate_layout(layout):
+    layout = str(layout).lower()
+    if sorted(layout) not in (['b', 'g', 'r'], ['b', 'g', 'r', 'w']):
+        raise ValueError(
+            "A pixel layout orders r, g, b and optionally w; got {}".format(layout))
+    return layout
+
+
+@lru_cache(maxsize=None)
+def gamma_lut(gamma):
+    """Return a table from linear light level to DMX value for a gamma.
+
+    A fixture with this gamma emits (value / 255) ** gamma of its full
+    output for a DMX value; the table inverts that for LUT_SIZE levels.
+    """
+    inverse = 1.0 / gamma
+    return bytes(
+        min(int(255.0 * (level / _LUT_MAX) ** inverse + 0.5), 255)
+        for level in range(LUT_SIZE))
+
+
+class Pixel:
+    """Addressing and response of an RGB or RGBW pixel.
+
+    layout orders the pixel's channels from its address, for example 'grb'
+    for most pixel strips.  gamma relates the fixture's DMX values to its
+    light output: 1.0 for plain PWM dimming, around 2.2 for fixtures that
+    apply a curve of their own.
+    """
+    def __init__(self, address, layout='rgb', gamma=1.0):
+        self.address = address
+        self.layout = validate_layout(layout)
+        self.gamma = validate_positive(gamma)
+
+
+def pixel_strip(address, count, layout='grb', gamma=1.0):
+    """Return count pixels on consecutive channels from address."""
+    footprint = len(validate_layout(layout))
+    return [
+        Pixel(address + index * footprint, layout, gamma)
+        for index in range(count)]
+
+
+def to_oklab(color):
+    """Convert a Color to Oklab coordinates."""
+    return linear_rgb_to_oklab(
+        *[srgb_to_linear(coord) for coord in color.in_rgb().coordinates])
+
+
+class PixelHustler(Controllable, patterns.PatternProperties):
+    """Ease a collection of pixels towards colors from a color generator.
+
+    easing is the distance in Oklab a pixel may move per second; black to
+    white is a distance of 1.  Pixel addresses index the buffer passed to
+    render, which holds universe_size channels.  Sweeps use the pixel
+    positions, which default to the pixels laid out in a row.
+    """
+    parameters = dict(
+        easing=validate_positive,
+        spread=validate_count,
+        **patterns.PATTERN_PARAMETERS
+    )
+
+    telemetry = ('step', 'active')
+
+    def __init__(self, col_gen, trig, pixels, clock, positions=None, seed=None,
+                 universe_size=DMX_UNIVERSE_SIZE):
+        self.easing = 1.0
+        self.spread = 1
+        self.col_gen = col_gen
+        self.trig = trig
+        self.clock = clock
+        self.pixels = pixels
+
+        # buffer indices of each pixel's red, green, blue and white channel,
+        # white -1 for RGB pixels, and the pixel's gamma table
+        self.outputs = []
+        for pixel in pixels:
+            index = pixel.address - 1
+            if index < 0 or index + len(pixel.layout) > universe_size:
+                raise ValueError(
+                    "A pixel at address {} doesn't fit in {} channels.".format(
+                        pixel.address, universe_size))
+            channels = {channel: index + offset for offset, channel in enumerate(pixel.layout)}
+            self.outputs.append((
+                channels['r'], channels['g'], channels['b'], channels.get('w', -1),
+                gamma_lut(pixel.gamma)))
+
+        # current and target Oklab coordinates, one list per component
+        initial = to_oklab(col_gen.get())
+        self.current = [[coord] * len(pixels) for coord in initial]
+        self.target = [[coord] * len(pixels) for coord in initial]
+        # indices of pixels that haven't reached their target
+        self.pending = set(range(len(pixels)))
+        self.active = len(self.pending)
+
+        self.last_render = clock.time()
+
+        if positions is None:
+            positions = [(float(index), 0.0) for index in range(len(pixels))]
+        self.init_pattern(positions, seed)
+
+    def get_state(self):
+        return dict(
+            current=[list(values) for values in self.current],
+            target=[list(values) for values in self.target],
+            **self.get_pattern_state())
+
+    def set_state(self, state):
+        # the pixel list may have changed since the state was saved
+        for values, saved in zip(self.current + self.target, state['current'] + state['target']):
+            values[:len(saved)] = saved[:len(values)]
+        self.pending = set(range(len(self.pixels)))
+        self.set_pattern_state(state)
+
+    def set_targets(self, indices):
+        """Give the pixels at indices a gradient of new target colors."""
+        count = len(indices)
+        colors = [to_oklab(color) for color in self.col_gen.get_many(min(self.spread, count))]
+        target_l, target_a, target_b = self.target
+
+        if len(colors) == 1:
+            lightness, a, b = colors[0]
+            for i in indices:
+                target_l[i] = lightness
+                target_a[i] = a
+                target_b[i] = b
+        else:
+            # position along the gradient, in colors, per pixel
+            scale = (len(colors) - 1) / (count - 1)
+            last = len(colors) - 2
+            for position, i in enumerate(indices):
+                x = position * scale
+                segment = min(int(x), last)
+                fraction = x - segment
+                l_0, a_0, b_0 = colors[segment]
+                l_1, a_1, b_1 = colors[segment + 1]
+                target_l[i] = l_0 + (l_1 - l_0) * fraction
+                target_a[i] = a_0 + (a_1 - a_0) * fraction
+                target_b[i] = b_0 + (b_1 - b_0) * fraction
+        self.pending.update(indices)
+
+    def render(self, dmx_frame):
+        now = self.clock.time()
+
+        dt = now - self.last_render
+        self.last_render = now
+
+        if self.trig.trigger():
+            indices = self.next_step()
+            if indices:
+                self.set_targets(indices)
+
+        if self.pending:
+            self._render_pending(dt, dmx_frame)
+        self.active = len(self.pending)
+
+    def _render_pending(self, dt, dmx_frame):
+        """Ease every pending pixel and write it to dmx_frame."""
+        max_distance = dt * self.easing
+        current_l, current_a, current_b = self.current
+        target_l, target_a, target_b = self.target
+        outputs = self.outputs
+        arrived = []
+
+        for i in self.pending:
+            lightness = current_l[i]
+            a = current_a[i]
+            b = current_b[i]
+            d_l = target_l[i] - lightness
+            d_a = target_a[i] - a
+            d_b = target_b[i] - b
+            distance = sqrt(d_l * d_l + d_a * d_a + d_b * d_b)
+            if distance <= max_distance:
+                arrived.append(i)
+                lightness = target_l[i]
+                a = target_a[i]
+                b = target_b[i]
+            else:
+                fraction = max_distance / distance
+                lightness += d_l * fraction
+                a += d_a * fraction
+                b += d_b * fraction
+            current_l[i] = lightness
+            current_a[i] = a
+            current_b[i] = b
+
+            red, green, blue = oklab_to_linear_rgb(lightness, a, b)
+            red = int(_LUT_MAX * red + 0.5)
+            green = int(_LUT_MAX * green + 0.5)
+            blue = int(_LUT_MAX * blue + 0.5)
+
+            # easing can pass briefly out of gamut
+            red = 0 if red < 0 else _LUT_MAX if red > _LUT_MAX else red
+            green = 0 if green < 0 else _LUT_MAX if green > _LUT_MAX else green
+            blue = 0 if blue < 0 else _LUT_MAX if blue > _LUT_MAX else blue
+
+            red_index, green_index, blue_index, white_index, lut = outputs[i]
+            if white_index >= 0:
+                white = min(red, green, blue)
+                red -= white
+                green -= white
+                blue -= white
+                dmx_frame[white_index] = lut[white]
+            dmx_frame[red_index] = lut[red]
+            dmx_frame[green_index] = lut[green]
+            dmx_frame[blue_index] = lut[blue]
+
+        self.pending.difference_update(arrived)
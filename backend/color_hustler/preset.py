@@ -0,0 +1,216 @@
+"""Capture, recall and crossfade the numeric parameters of a show."""
+import json
+import os
+import struct
+import traceback
+from array import array
+
+from .controllable import Controllable
+
+# file header: magic, length of the JSON index that follows
+_HEADER = struct.Struct('<4sI')
+_MAGIC = b'CHPR'
+
+
+def validate_fade(value):
+    value = float(value)
+    if value < 0.0:
+        raise ValueError("Fade time must not be negative.")
+    return value
+
+
+class Preset:
+    """Values for a set of "name.parameter" keys."""
+    def __init__(self, keys, values):
+        self.keys = keys
+        self.values = values
+
+
+class Crossfade:
+    """Linear interpolation of many parameters from one set of values to another."""
+    def __init__(self, names, setters, start, end, start_time, duration):
+        self.names = names
+        self.setters = setters
+        self.start = start
+        self.delta = array('d', [b - a for a, b in zip(start, end)])
+        self.end = end
+        self.start_time = start_time
+        self.duration = duration
+
+    def values(self, now):
+        """Return the interpolated values at a time, or None if the fade is done."""
+        if self.duration <= 0.0:
+            return None
+        progress = (now - self.start_time) / self.duration
+        if progress >= 1.0:
+            return None
+        return [a + d * progress for a, d in zip(self.start, self.delta)]
+
+
+class PresetStore(Controllable):
+    """Named snapshots of every numeric parameter in a show.
+
+    Register this with the show to control it with commands:
+        presets.save: capture the current look under a name
+        presets.recall: fade to a named look over the current fade time
+        presets.delete: forget a named look
+        presets.fade: crossfade time in seconds; 0 cuts at the next frame
+
+    Recalls are never applied while commands are being processed; they take
+    effect all at once at the start of the next frame, and crossfades update
+    every parameter together once per frame.
+    """
+    parameters = dict(
+        save=str,
+        recall=str,
+        delete=str,
+        fade=validate_fade,
+    )
+
+    actions = frozenset(['save', 'recall', 'delete'])
+
+    def __init__(self, show, path=None):
+        """Create a preset store for a show.
+
+        If path is provided, presets are loaded from it if it exists and
+        written back to it whenever they change.
+        """
+        self.show = show
+        self.path = path
+        self.fade = 0.0
+        self.presets = {}
+        self._crossfade = None
+
+        if path is not None and os.path.exists(path):
+            self.presets = load_presets(path)
+
+        show.before_render.append(self.update)
+
+    def capture(self):
+        """Return a Preset holding the current value of every numeric parameter."""
+        keys, values = [], array('d')
+        for name, entity in self.show.entities.items():
+            if entity is self:
+                continue
+            for parameter in entity.parameters:
+                if parameter in entity.actions or parameter in entity.aliases:
+                    continue
+                value = getattr(entity, parameter)
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                keys.append("{}.{}".format(name, parameter))
+                values.append(value)
+        return Preset(keys, values)
+
+    @property
+    def save(self):
+        return None
+
+    @save.setter
+    def save(self, name):
+        self.presets[name] = self.capture()
+        self._write()
+
+    @property
+    def delete(self):
+        return None
+
+    @delete.setter
+    def delete(self, name):
+        self.presets.pop(name, None)
+        self._write()
+
+    @property
+    def recall(self):
+        return None
+
+    @recall.setter
+    def recall(self, name):
+        try:
+            preset = self.presets[name]
+        except KeyError:
+            raise ValueError("No preset named '{}'.".format(name))
+
+        names, setters, start, end = [], [], array('d'), array('d')
+        for key, value in zip(preset.keys, preset.values):
+            try:
+                name, setter = self.show.dispatch[key]
+            except KeyError:
+                # this entity isn't in the current show
+                continue
+            names.append(name)
+            setters.append(setter)
+            start.append(self.show.get_parameter(key))
+            end.append(value)
+
+        # replace any fade in progress, starting from where it got to
+        self._crossfade = Crossfade(
+            names, setters, start, end, self.show.clock.time(), self.fade)
+
+    def update(self):
+        """Apply any pending recall or crossfade step for this frame."""
+        crossfade = self._crossfade
+        if crossfade is None:
+            return
+
+        values = crossfade.values(self.show.clock.time())
+        if values is None:
+            values = crossfade.end
+            self._crossfade = None
+            for name in set(crossfade.names):
+                self.show.mark_changed(name)
+
+        try:
+            for setter, value in zip(crossfade.setters, values):
+                setter(value)
+        except Exception:
+            # a value a parameter no longer accepts; abandon the fade
+            # rather than the frame
+            self._crossfade = None
+            for name in set(crossfade.names):
+                self.show.mark_changed(name)
+            self.show.respond(('error', traceback.format_exc()))
+
+    def _write(self):
+        if self.path is not None:
+            write_presets(self.path, self.presets)
+
+
+def write_presets(path, presets):
+    """Write presets to a file, replacing it atomically."""
+    index = []
+    body = array('d')
+    for name, preset in presets.items():
+        index.append(dict(name=name, keys=preset.keys))
+        body.extend(preset.values)
+    index_bytes = json.dumps(index).encode('utf-8')
+
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(_HEADER.pack(_MAGIC, len(index_bytes)))
+        f.write(index_bytes)
+        f.write(body.tobytes())
+    os.replace(temp_path, path)
+
+
+def load_presets(path):
+    """Load presets written by write_presets."""
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    magic, index_len = _HEADER.unpack_from(data)
+    if magic != _MAGIC:
+        raise ValueError("{} is not a preset file.".format(path))
+    start = _HEADER.size
+    index = json.loads(data[start:start + index_len].decode('utf-8'))
+
+    body = array('d')
+    body.frombytes(data[start + index_len:])
+
+    presets = {}
+    offset = 0
+    for entry in index:
+        count = len(entry['keys'])
+        presets[entry['name']] = Preset(entry['keys'], body[offset:offset + count])
+        offset += count
+    return presets
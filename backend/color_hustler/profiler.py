@@ -0,0 +1,140 @@
+"""Low-overhead per-entity render profiling."""
+from time import perf_counter
+
+
+def _organist_name(organist):
+    return "organist{}".format(organist.ctrl_channel)
+
+
+class EntityProfile:
+    """Accumulated timing for one entity."""
+    def __init__(self):
+        # time spent in this entity itself, excluding profiled entities it calls
+        self.self_time = 0.0
+        # time including everything this entity called
+        self.total_time = 0.0
+        # largest self time in a single sampled frame
+        self.max_frame_time = 0.0
+
+
+class Profiler:
+    """Time the render path of every named entity in a show.
+
+    While enabled, the render methods of the show's entities are wrapped so
+    their time is attributed to their registered names; when disabled the
+    wrappers are removed and cost nothing.  Only one frame in every
+    sample_every is timed, and time spent inside another profiled entity is
+    subtracted from the caller, so a slow generator shows up under its own
+    name rather than under every modulator downstream of it.
+    """
+    def __init__(self, show, sample_every=10):
+        self.show = show
+        self.sample_every = sample_every
+        self.enabled = False
+        self.sampling = False
+        self.sampled_frames = 0
+        self.profiles = {}
+        self._frame_times = {}
+        # accumulated child time for each profiled call in progress
+        self._stack = []
+        self._wrapped = []
+
+    def targets(self):
+        """Yield (name, object, method name) for everything to profile."""
+        for name, entity in self.show.entities.items():
+            for method in ('get', 'render'):
+                if hasattr(entity, method):
+                    yield name, entity, method
+        for organist in self.show.ordered_organists():
+            name = _organist_name(organist)
+            yield name, organist, 'play'
+            yield name + '.col_gen', organist.col_gen, 'get'
+
+    def enable(self):
+        if self.enabled:
+            return
+        for name, obj, method in self.targets():
+            setattr(obj, method, self._timed(name, getattr(obj, method)))
+            self._wrapped.append((obj, method))
+        self.show.before_render.append(self._start_frame)
+        self.show.after_render.append(self._end_frame)
+        self.enabled = True
+
+    def disable(self):
+        if not self.enabled:
+            return
+        for obj, method in self._wrapped:
+            # remove the instance attribute to expose the class method again
+            delattr(obj, method)
+        self._wrapped = []
+        self.show.before_render.remove(self._start_frame)
+        self.show.after_render.remove(self._end_frame)
+        self.sampling = False
+        self.enabled = False
+
+    def reset(self):
+        self.profiles = {}
+        self.sampled_frames = 0
+
+    def _timed(self, name, method):
+        def profiled(*args):
+            if not self.sampling:
+                return method(*args)
+            stack = self._stack
+            stack.append(0.0)
+            start = perf_counter()
+            try:
+                return method(*args)
+            finally:
+                elapsed = perf_counter() - start
+                children = stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+                self_time, total_time = self._frame_times.get(name, (0.0, 0.0))
+                self._frame_times[name] = (
+                    self_time + elapsed - children, total_time + elapsed)
+        return profiled
+
+    def _start_frame(self):
+        self.sampling = self.show.frame % self.sample_every == 0
+
+    def _end_frame(self):
+        if not self.sampling:
+            return
+        self.sampling = False
+        self.sampled_frames += 1
+        for name, (self_time, total_time) in self._frame_times.items():
+            profile = self.profiles.get(name)
+            if profile is None:
+                profile = self.profiles[name] = EntityProfile()
+            profile.self_time += self_time
+            profile.total_time += total_time
+            profile.max_frame_time = max(profile.max_frame_time, self_time)
+        self._frame_times = {}
+
+    def top(self, n=20):
+        """Return rows for the n entities with the most self time per frame.
+
+        Times are in milliseconds per sampled frame.
+        """
+        frames = max(self.sampled_frames, 1)
+        rows = [
+            dict(
+                name=name,
+                self_ms=1e3 * profile.self_time / frames,
+                total_ms=1e3 * profile.total_time / frames,
+                max_ms=1e3 * profile.max_frame_time,
+            )
+            for name, profile in self.profiles.items()]
+        rows.sort(key=lambda row: row['self_ms'], reverse=True)
+        return rows[:n]
+
+    def format_top(self, n=20):
+        """Return the top n entities as a text table."""
+        lines = [
+            "Profile over {} sampled frames (ms per frame):".format(self.sampled_frames),
+            "{:40} {:>10} {:>10} {:>10}".format("entity", "self", "total", "max self"),
+        ]
+        for row in self.top(n):
+            lines.append("{name:40} {self_ms:10.3f} {total_ms:10.3f} {max_ms:10.3f}".format(**row))
+        return "\n".join(lines)
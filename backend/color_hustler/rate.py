@@ -1,5 +1,4 @@
 """Entities relating to the progression of time."""
-import time
 from .controllable import Controllable
 
 class Rate(object):
@@ -87,21 +86,25 @@ class Trigger(Controllable, RateProperties):
         reset=bool,
         active=bool)
 
-    def __init__(self, rate, clock=None):
+    actions = frozenset(['reset'])
+
+    aliases = frozenset(['period', 'hz'])
+
+    def __init__(self, rate, clock):
         """Create a new Trigger.
 
         This trigger will initially be in a state where it will fire immediately
         when first polled.
 
-        Uses the name registration system to get the clock.
+        The clock is any object with a time() method, usually the show's
+        FrameClock.
         """
         self._rate = rate
-        if clock is None:
-            from . import frame_clock as clock
-
         self.clock = clock
         self.last_trig = clock.time() - self.period
         self.active = True
+        # number of times this trigger has fired
+        self.count = 0
 
     @property
     def reset(self):
@@ -111,6 +114,14 @@ class Trigger(Controllable, RateProperties):
     def reset(self, _):
         self.last_trig = self.clock.time() - self.period
 
+    def get_state(self):
+        # store elapsed time rather than a timestamp, as the clock may restart
+        return dict(elapsed=self.clock.time() - self.last_trig, count=self.count)
+
+    def set_state(self, state):
+        self.last_trig = self.clock.time() - state['elapsed']
+        self.count = state['count']
+
     def trigger(self):
         """Return True if it is time to trigger, and reset trigger clock."""
         if not self.active:
@@ -119,6 +130,7 @@ class Trigger(Controllable, RateProperties):
         now = self.clock.time()
         if self._time_until_trig(now) <= 0.0:
             self.last_trig = now
+            self.count += 1
             return True
         return False
 
@@ -129,6 +141,14 @@ class Trigger(Controllable, RateProperties):
         """
         return self._time_until_trig(self.clock.time())
 
+    def time_until_bar(self, beats):
+        """Return the time until the next trigger event that starts a bar.
+
+        Bars are counted in groups of beats trigger events from the first time
+        this trigger fired.
+        """
+        return self.time_until_trig() + ((-self.count) % beats) * self.period
+
     def _time_until_trig(self, now):
         """Return the time until the next trigger event.
 
@@ -0,0 +1,140 @@
+"""Record show commands with frame timing and play them back.
+
+A command log is a header followed by append-only records.  Each record is a
+fixed-size header holding the frame the command followed, the monotonic time
+since recording started, and the length of the JSON-encoded command after it.
+Frame numbers are relative to the frame recording started on.
+"""
+import json
+import mmap
+import struct
+import time
+from array import array
+from bisect import bisect_left
+
+_FILE_HEADER = struct.Struct('<4sH')
+_MAGIC = b'CHCL'
+_FORMAT_VERSION = 1
+
+_RECORD = struct.Struct('<QdI')
+
+
+class CommandRecorder:
+    """Append every command the show receives to a log file."""
+    def __init__(self, path, start_frame):
+        self.path = path
+        self.start_frame = start_frame
+        self.start_time = time.monotonic()
+        self._file = open(path, 'wb')
+        self._file.write(_FILE_HEADER.pack(_MAGIC, _FORMAT_VERSION))
+
+    def record(self, frame, cmd):
+        """Record a command received after a frame was rendered."""
+        data = json.dumps(cmd).encode('utf-8')
+        self._file.write(_RECORD.pack(
+            frame - self.start_frame, time.monotonic() - self.start_time, len(data)))
+        self._file.write(data)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class CommandLog:
+    """Random access to a recorded command log through a memory map.
+
+    Opening a log only reads the fixed-size record headers to build an index,
+    so seeking to any frame is a binary search.
+    """
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version = _FILE_HEADER.unpack_from(self._map)
+        if magic != _MAGIC:
+            raise ValueError("{} is not a command log.".format(path))
+        if version != _FORMAT_VERSION:
+            raise ValueError("Unsupported command log version {}.".format(version))
+
+        self.frames = array('Q')
+        self.offsets = array('Q')
+        offset = _FILE_HEADER.size
+        end = len(self._map)
+        while offset + _RECORD.size <= end:
+            frame, _, length = _RECORD.unpack_from(self._map, offset)
+            if offset + _RECORD.size + length > end:
+                # the recording was cut off in the middle of a record
+                break
+            self.frames.append(frame)
+            self.offsets.append(offset)
+            offset += _RECORD.size + length
+
+    def __len__(self):
+        return len(self.frames)
+
+    def index_of_frame(self, frame):
+        """Return the index of the first command at or after a frame."""
+        return bisect_left(self.frames, frame)
+
+    def read(self, index):
+        """Return the frame, timestamp and command of a record."""
+        offset = self.offsets[index]
+        frame, timestamp, length = _RECORD.unpack_from(self._map, offset)
+        start = offset + _RECORD.size
+        cmd = json.loads(self._map[start:start + length].decode('utf-8'))
+        return frame, timestamp, cmd
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+class CommandPlayer:
+    """Re-inject recorded commands at the same frame offsets they arrived at.
+
+    Commands recorded after frame N of the recording are applied right after
+    frame N of playback is output, exactly where the live show handled them.
+    Commands that arrived before recording's first frame are applied on start.
+    """
+    def __init__(self, show, path, start_frame=0, catch_up=True):
+        """Play a log on a show, starting start_frame frames into the recording.
+
+        See seek for the meaning of catch_up.
+        """
+        self.show = show
+        self.log = CommandLog(path)
+        self.index = 0
+        # the show frame that corresponds to frame 0 of the recording
+        self.frame_offset = show.frame
+        self.seek(start_frame, catch_up)
+
+    @property
+    def done(self):
+        return self.index >= len(self.log)
+
+    def seek(self, frame, catch_up=True):
+        """Jump to a frame of the recording.
+
+        If catch_up is True, commands skipped over by seeking forward are
+        applied immediately, without rendering any frames, so parameters match
+        the recording.  Otherwise, and whenever seeking backward, playback is
+        repositioned with a binary search and skipped commands are ignored.
+        """
+        if not catch_up or frame < self.show.frame - self.frame_offset:
+            self.index = self.log.index_of_frame(frame)
+        self.frame_offset = self.show.frame - frame
+        self._advance_to(frame)
+
+    def update(self):
+        """Apply the commands recorded after the frame that was just output."""
+        self._advance_to(self.show.frame - self.frame_offset)
+
+    def _advance_to(self, frame):
+        log = self.log
+        while self.index < len(log) and log.frames[self.index] <= frame:
+            _, _, cmd = log.read(self.index)
+            self.index += 1
+            self.show.handle_command(tuple(cmd), record=False)
+
+    def close(self):
+        self.log.close()
@@ -0,0 +1,54 @@
+"""Hold commands until the frame they should be applied on."""
+import math
+
+
+class TimingWheel:
+    """Schedule items for future frames with O(1) insertion and dispatch.
+
+    Items due within one revolution of the wheel go straight into the slot for
+    their frame.  Items further out are parked by revolution and moved onto
+    the wheel when it reaches that revolution, so each item is moved at most
+    once.  Frames must be advanced one at a time.
+    """
+    def __init__(self, frame=0, size=1024):
+        self.size = size
+        # the most recently dispatched frame
+        self.frame = frame
+        self.slots = [[] for _ in range(size)]
+        # revolution number to list of (frame, item)
+        self.overflow = {}
+        self.pending = 0
+
+    def schedule(self, frame, item):
+        """Schedule an item for a frame.
+
+        Items scheduled for a frame that has already been dispatched are
+        dispatched on the next frame.
+        """
+        frame = max(frame, self.frame + 1)
+        if frame - self.frame < self.size:
+            self.slots[frame % self.size].append(item)
+        else:
+            self.overflow.setdefault(frame // self.size, []).append((frame, item))
+        self.pending += 1
+
+    def advance(self):
+        """Move to the next frame and return the items due on it."""
+        self.frame += 1
+        frame = self.frame
+
+        if frame % self.size == 0:
+            for due_frame, item in self.overflow.pop(frame // self.size, ()):
+                self.slots[due_frame % self.size].append(item)
+
+        index = frame % self.size
+        items = self.slots[index]
+        if items:
+            self.slots[index] = []
+            self.pending -= len(items)
+        return items
+
+
+def frames_until(seconds, framerate):
+    """Return how many frames from now a time falls on, at least one."""
+    return max(1, math.ceil(seconds * framerate))
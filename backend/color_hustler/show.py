@@ -1,34 +1,95 @@
 """The show runtime environment."""
 import time
 import traceback
+from collections import OrderedDict
+from fnmatch import fnmatchcase
 from queue import Empty, Queue
-
-import mido
+from threading import Lock
 
 from .rate import Trigger, Rate
-from . import frame_clock
+from .recording import CommandPlayer, CommandRecorder
+from .scheduler import TimingWheel, frames_until
+from .frame_clock import FrameClock, LiveClock
+from .parallel import ParallelRenderer
+from .profiler import Profiler
+from .trace import Tracer
+
+# commands that control recording and playback are never recorded themselves
+_UNRECORDED = frozenset(['stop', 'record', 'play', 'seek', 'snapshot'])
+
+
+def validate_command(cmd):
+    """Split cmd into a (cmd_type, payload) tuple and its apply at.
+
+    Raise ValueError unless cmd is a list or tuple of a command type,
+    a payload and optionally an apply at, which is None if not given.
+    """
+    if not isinstance(cmd, (list, tuple)) or len(cmd) not in (2, 3) or not isinstance(cmd[0], str):
+        raise ValueError("Invalid command: {!r}".format(cmd))
+    if len(cmd) == 3:
+        cmd_type, payload, at = cmd
+        return (cmd_type, payload), at
+    return tuple(cmd), None
 
 
 class Show(object):
     """Encapsulate the show runtime environment."""
-    def __init__(self, framerate, midi_port, dmx_port=None):
-        frame_clock.tick()
-        self.render_trigger = Trigger(rate=Rate(hz=framerate), clock=time)
+    def __init__(self, framerate, midi_port, dmx_port=None, clock=None):
+        """Create a show.
+
+        The clock is the FrameClock shared by every time-dependent entity in
+        the show; by default it follows the system monotonic clock.  Frames are
+        scheduled directly from the clock's time source.
+        """
+        self.clock = FrameClock() if clock is None else clock
+        self.render_trigger = Trigger(
+            rate=Rate(hz=framerate), clock=LiveClock(self.clock.source))
 
         self.entities = dict()
+        # map of "name.parameter" to the entity name and a bound parameter setter
+        self.dispatch = dict()
+        # map of glob pattern to the list of dispatch entries it expands to
+        self._pattern_cache = dict()
+
+        # Incremented every time a parameter changes.  Entity names are kept
+        # ordered by the version of their most recent change so that changes
+        # since a given version can be found without visiting every entity.
+        # Versions start from the wall clock in milliseconds, so a version
+        # seen by a client during an earlier run is older than anything in
+        # this one.
+        self.version = int(time.time() * 1000)
+        self._changes = OrderedDict()
+        self._changes_lock = Lock()
         self.organists = set()
         self.gobo_hustler = None
         self.dimmer_hustler = None
+        self.pixel_hustler = None
         self.dmx_port = dmx_port
 
         self.cmd_queue = Queue()
         # callables that are passed command responses
         self.responders = []
+        # callables invoked at the start of every frame, before rendering
+        self.before_render = []
+        # callables invoked at the end of every frame, after output is sent
+        self.after_render = []
+
+        # number of frames rendered so far
+        self.frame = 0
+        # optional command recording and playback
+        self.recorder = None
+        self.player = None
+        # commands waiting for the frame they should be applied on
+        self.scheduler = TimingWheel(self.frame)
+        self.profiler = Profiler(self)
+        # renders organists and hustlers in worker processes when enabled
+        self.parallel = None
+        # structured trace records, drained off the render thread
+        self.tracer = Tracer()
 
         self.midi_port = midi_port
 
         self.running = False
-        self.debug = False
 
     def register_entity(self, entity, name):
         """Add a named entity to the show runtime environment.
@@ -41,15 +102,87 @@ class Show(object):
             raise ValueError("{} is not controllable.".format(entity))
         self.entities[name] = entity
 
+        for parameter in entity.parameters:
+            self.dispatch["{}.{}".format(name, parameter)] = (
+                name, entity.parameter_setter(parameter))
+
+        # new entities may match existing patterns
+        self._pattern_cache.clear()
+        self.mark_changed(name)
+
+    def expand_pattern(self, pattern):
+        """Return the dispatch entries for every command matching a glob pattern.
+
+        Expansions are cached until another entity is registered.
+        """
+        try:
+            return self._pattern_cache[pattern]
+        except KeyError:
+            pass
+        entries = [
+            entry for cmd_type, entry in self.dispatch.items()
+            if fnmatchcase(cmd_type, pattern)]
+        self._pattern_cache[pattern] = entries
+        return entries
+
+    def mark_changed(self, name):
+        """Record that the parameters of the named entity have changed."""
+        with self._changes_lock:
+            self.version += 1
+            self._changes[name] = self.version
+            self._changes.move_to_end(name)
+
+    def get_parameter(self, cmd_type):
+        """Return the current value of a "name.parameter"."""
+        name, _, parameter = cmd_type.partition('.')
+        try:
+            entity = self.entities[name]
+        except KeyError:
+            raise ValueError("No entity with name '{}'.".format(name))
+        return entity.get_parameter(parameter)
+
+    def snapshot(self, since=0):
+        """Return the current version and the parameters changed since a version.
+
+        Parameters are returned as a dict keyed by "name.parameter".  Pass the
+        version from a previous snapshot to receive only the entities that have
+        changed since then, or 0 to receive everything.  A version this show
+        hasn't reached yet, as from a clock that has since been set back,
+        also receives everything.
+
+        Safe to call from any thread.  Raise ValueError if since isn't a
+        version number.
+        """
+        try:
+            since = int(since or 0)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid snapshot version: {!r}".format(since))
+        with self._changes_lock:
+            version = self.version
+            if since > version:
+                since = 0
+            changed = []
+            for name, changed_at in reversed(self._changes.items()):
+                if changed_at <= since:
+                    break
+                changed.append(name)
+
+        parameters = {}
+        for name in changed:
+            for parameter, value in self.entities[name].snapshot().items():
+                parameters["{}.{}".format(name, parameter)] = value
+        return version, parameters
+
     def run(self):
         """Run the show application."""
         self.running = True
         # call first tick
-        frame_clock.tick()
+        self.clock.tick()
         # application loop
         while True:
             # if we have been instructed to quit, do so
             if not self.running:
+                self.render_serially()
                 return
             if self.render_trigger.trigger():
                 # render this frame to midi
@@ -59,24 +192,74 @@ class Show(object):
                 # we are not ready to draw a frame, process show commands
                 self.process_commands_until_render()
 
+    def ordered_organists(self):
+        """Return the organists by midi channel, so output order is stable."""
+        return sorted(self.organists, key=lambda organist: organist.ctrl_channel)
+
+    def render_in_parallel(self, processes=None):
+        """Render independent organists and hustlers in worker processes.
+
+        See parallel.ParallelRenderer; call once the show is fully built.
+        """
+        self.render_serially()
+        self.parallel = ParallelRenderer(self, processes)
+
+    def render_serially(self):
+        """Stop any parallel rendering and shut down its workers."""
+        if self.parallel is not None:
+            self.parallel.close()
+            self.parallel = None
+
     def render(self):
         """Render the current frame to midi."""
-        frame_clock.tick()
+        self.clock.tick()
+        self.frame += 1
 
-        # command the organists to play
-        for organist in self.organists:
-            organist.play(self.midi_port)
+        for cmd in self.scheduler.advance():
+            # record this as arriving just before this frame, as it was applied
+            if self.recorder is not None:
+                self.recorder.record(self.frame - 1, cmd)
+            self.handle_command(cmd, record=False)
 
-        if self.dmx_port is not None:
-            if self.gobo_hustler is not None:
-                self.gobo_hustler.render(self.dmx_port.dmx_frame)
+        for hook in self.before_render:
+            hook()
+
+        if self.parallel is not None:
+            self.parallel.render(
+                self.midi_port,
+                self.dmx_port.dmx_frame if self.dmx_port is not None else None)
+        else:
+            # command the organists to play
+            for organist in self.ordered_organists():
+                organist.play(self.midi_port)
 
-            if self.dimmer_hustler is not None:
-                self.dimmer_hustler.render(self.dmx_port.dmx_frame)
-            if self.debug:
-                print(self.dmx_port.dmx_frame[:9], self.dmx_port.dmx_frame[454:])
+            if self.dmx_port is not None:
+                if self.gobo_hustler is not None:
+                    self.gobo_hustler.render(self.dmx_port.dmx_frame)
+
+                if self.dimmer_hustler is not None:
+                    self.dimmer_hustler.render(self.dmx_port.dmx_frame)
+
+                if self.pixel_hustler is not None:
+                    self.pixel_hustler.render(self.dmx_port.dmx_frame)
+
+        if self.dmx_port is not None:
+            if self.tracer.dmx:
+                now = self.clock.time()
+                dmx_frame = self.dmx_port.dmx_frame
+                self.tracer.trace_dmx_window(now, dmx_frame, 0, 9)
+                self.tracer.trace_dmx_window(now, dmx_frame, 454, len(dmx_frame) - 454)
             self.dmx_port.render()
 
+        for hook in self.after_render:
+            hook()
+
+        if self.player is not None:
+            self.player.update()
+            if self.player.done:
+                self.stop_playback()
+                self.respond(('message', "Playback finished."))
+
     def process_commands_until_render(self):
         """Use any remaining time until rendering a frame to handle commands."""
         while True:
@@ -93,22 +276,119 @@ class Show(object):
                 # fine if we didn't get a control event
                 pass
             else:
-                # try to process the command, if any error just send
-                # a reply and continue
-                try:
-                    resp = self.process_command(cmd)
-                except Exception:
-                    resp = ('error', traceback.format_exc())
+                self.handle_command(cmd)
+
+    def handle_command(self, cmd, record=True):
+        """Process a command and send any response to the responders.
+
+        Commands with a third "apply at" element are scheduled rather than
+        processed immediately; see schedule.
+
+        If recording, the command is logged first unless record is False.
+        Scheduled commands are recorded when they are applied.
+        """
+        try:
+            cmd, at = validate_command(cmd)
+        except ValueError:
+            self.respond(('error', traceback.format_exc()))
+            return
+
+        if at is not None:
+            try:
+                self.schedule(cmd, at)
+            except Exception:
+                self.respond(('error', traceback.format_exc()))
+            return
+
+        if record and self.recorder is not None and cmd[0] not in _UNRECORDED:
+            # a failed write loses this command from the log, not the show
+            try:
+                self.recorder.record(self.frame, cmd)
+            except Exception:
+                self.respond(('error', traceback.format_exc()))
+
+        # try to process the command, if any error just send
+        # a reply and continue
+        try:
+            resp = self.process_command(cmd)
+        except Exception:
+            resp = ('error', traceback.format_exc())
+
+        if resp is not None:
+            self.respond(resp)
+
+    def schedule(self, cmd, at):
+        """Schedule a command to be applied at the start of a future frame.
+
+        at may be:
+            an int: the absolute frame number
+            {"beat": name}: the frame the named trigger next fires on
+            {"bar": name, "beats": n}: the frame the named trigger next starts
+                a bar of n beats on
+        """
+        if isinstance(at, int):
+            frame = at
+        else:
+            if 'beat' in at:
+                trigger = self.entities[at['beat']]
+                time_until = trigger.time_until_trig()
+            elif 'bar' in at:
+                trigger = self.entities[at['bar']]
+                time_until = trigger.time_until_bar(int(at['beats']))
+            else:
+                raise ValueError("Invalid command time: {}".format(at))
+            frame = self.frame + frames_until(time_until, self.render_trigger.hz)
+        self.scheduler.schedule(frame, cmd)
+
+    def respond(self, resp):
+        """Pass a response to every responder."""
+        for respond in self.responders:
+            respond(resp)
 
-                if resp is not None:
-                    for respond in self.responders:
-                        respond(resp)
+    def start_recording(self, path):
+        """Record every command received from now on to a log file."""
+        self.stop_recording()
+        self.recorder = CommandRecorder(path, self.frame)
+
+    def stop_recording(self):
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+    def start_playback(self, path, start_frame=0):
+        """Play back a command log, starting start_frame frames in."""
+        self.stop_playback()
+        self.player = CommandPlayer(self, path, start_frame)
+
+    def stop_playback(self):
+        if self.player is not None:
+            self.player.close()
+            self.player = None
+
+    def profile(self, action):
+        """Control the render profiler.
+
+        action is True or False to start or stop profiling, "reset" to clear
+        the results, or "report" or a number n to report the top entities.
+        """
+        if action is True:
+            self.profiler.enable()
+            return 'message', "Profiling enabled."
+        if action is False:
+            self.profiler.disable()
+            return 'message', "Profiling disabled."
+        if action == 'reset':
+            self.profiler.reset()
+            return 'message', "Profile reset."
+        n = 20 if action == 'report' else int(action)
+        self.respond(('profile', self.profiler.top(n)))
+        return 'message', self.profiler.format_top(n)
 
     def process_command(self, cmd):
         cmd_type, payload = cmd
 
-        if self.debug:
-            print("Handling command", cmd)
+        if self.tracer.command:
+            self.tracer.trace_command(self.clock.time(), cmd)
 
         if cmd_type == 'stop':
             self.running = False
@@ -118,15 +398,71 @@ class Show(object):
             return 'message', "Show entities: {}".format(", ".join(self.entities))
 
         if cmd_type == 'debug':
-            self.debug = payload
+            self.tracer.enable_all(bool(payload))
             return 'message', "Debug: {}".format(payload)
 
+        if cmd_type == 'trace':
+            subsystem, enabled = payload
+            self.tracer.enable(subsystem, bool(enabled))
+            return 'message', "Trace {}: {}".format(subsystem, enabled)
+
+        if cmd_type == 'record':
+            if payload:
+                self.start_recording(payload)
+                return 'message', "Recording commands to {}.".format(payload)
+            self.stop_recording()
+            return 'message', "Stopped recording."
+
+        if cmd_type == 'play':
+            if not payload:
+                self.stop_playback()
+                return 'message', "Stopped playback."
+            if isinstance(payload, str):
+                path, start_frame = payload, 0
+            else:
+                path, start_frame = payload
+            self.start_playback(path, start_frame)
+            return 'message', "Playing back commands from {}.".format(path)
+
+        if cmd_type == 'seek':
+            if self.player is None:
+                return 'message', "Nothing is playing."
+            self.player.seek(int(payload))
+            return None
+
+        if cmd_type == 'profile':
+            return self.profile(payload)
+
+        if cmd_type == 'get':
+            return 'message', "{}: {!r}".format(payload, self.get_parameter(payload))
+
+        if cmd_type == 'snapshot':
+            # answered to whoever asked, identified by request
+            request, since = payload
+            version, parameters = self.snapshot(since=since)
+            return 'snapshot', [request, version, parameters]
+
         # otherwise, assume this is a name.property command and try to run it
-        name, parameter = cmd_type.split('.')
         try:
-            entity = self.entities[name]
+            name, setter = self.dispatch[cmd_type]
         except KeyError:
-            return 'message', "No entity with name '{}'.".format(name)
+            pass
+        else:
+            setter(payload)
+            self.mark_changed(name)
+            return None
 
-        entity.set_parameter(parameter, payload)
-        return None
+        # maybe this is a glob pattern addressing several entities
+        if any(c in cmd_type for c in '*?['):
+            entries = self.expand_pattern(cmd_type)
+            if not entries:
+                return 'message', "No parameters match '{}'.".format(cmd_type)
+            for name, setter in entries:
+                setter(payload)
+                self.mark_changed(name)
+            return None
+
+        name, _, parameter = cmd_type.partition('.')
+        if name not in self.entities:
+            return 'message', "No entity with name '{}'.".format(name)
+        raise ValueError('No parameter with name "{}".'.format(parameter))
@@ -0,0 +1,191 @@
+"""Flood a headless show with websocket slider traffic and measure the damage.
+
+Simulated clients connect to the real websocket server and drag sliders the
+way the frontend does, sending [name.attr, value] messages at a fixed rate.
+The show runs live on the system clock with loopback devices.  Reported:
+
+    frame lateness: how much longer than one frame period each frame took
+    queue depth: commands waiting in the show's queue at each frame
+    command latency: time from a client sending a command to the start of the
+        first frame rendered after it was applied
+
+    python -m color_hustler.soak --clients 8 --rate 60 --duration 30
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+from threading import Thread
+from time import monotonic, sleep
+
+import websockets
+
+from . import create_show, run_websocket_server
+from .benchmark import percentile
+from .broadcast import BroadcastHub
+from .dimmer import Dimmer
+from .gobo_rotator import RotoQDmx
+from .loopback import LoopbackDmxPort, LoopbackMidiPort
+
+# parameters a person might drag a slider on, with the slider range
+SLIDERS = {
+    'center': (0.0, 1.0),
+    'width': (0.0, 1.0),
+    'amplitude': (0.0, 1.0),
+    'bpm': (1.0, 600.0),
+    'easing': (0.01, 1.0),
+}
+
+
+class SoakProbe:
+    """Collect timing measurements from a running show."""
+    def __init__(self, show):
+        self.show = show
+        # (cmd_type, value) to the time it was sent
+        self.sent = {}
+        self.applied = []
+        self.lateness = []
+        self.queue_depth = []
+        self.latency = []
+        self._last_frame = None
+
+        handle_command = show.handle_command
+
+        def handle_and_note(cmd, record=True):
+            handle_command(cmd, record)
+            self.applied.append(cmd)
+
+        show.handle_command = handle_and_note
+        show.before_render.append(self.on_frame)
+
+    def on_frame(self):
+        now = self.show.clock.time()
+        if self._last_frame is not None:
+            self.lateness.append(
+                now - self._last_frame - self.show.render_trigger.period)
+        self._last_frame = now
+        self.queue_depth.append(self.show.cmd_queue.qsize())
+
+        applied, self.applied = self.applied, []
+        for cmd in applied:
+            try:
+                sent = self.sent.pop(tuple(cmd))
+            except (KeyError, TypeError):
+                continue
+            self.latency.append(now - sent)
+
+    def report(self):
+        def stats(values, scale):
+            values = sorted(values) or [0.0]
+            return dict(
+                mean=scale * sum(values) / len(values),
+                p50=scale * percentile(values, 0.5),
+                p90=scale * percentile(values, 0.9),
+                p99=scale * percentile(values, 0.99),
+                max=scale * values[-1],
+            )
+        return dict(
+            frames=len(self.queue_depth),
+            commands=len(self.latency),
+            frame_lateness_ms=stats(self.lateness, 1e3),
+            queue_depth=stats(self.queue_depth, 1),
+            command_latency_ms=stats(self.latency, 1e3),
+        )
+
+
+async def drag_sliders(uri, targets, rate, duration, probe, seed):
+    """Act like one person dragging sliders for duration seconds."""
+    rand = random.Random(seed)
+    period = 1.0 / rate
+    async with websockets.connect(uri) as websocket:
+        end = monotonic() + duration
+        while monotonic() < end:
+            cmd_type = rand.choice(targets)
+            low, high = SLIDERS[cmd_type.rpartition('.')[2]]
+            phase = rand.random()
+            # drag this slider for a second or two, then grab another
+            for step in range(rand.randint(int(rate), int(2 * rate))):
+                position = (math.sin(phase + step * period) + 1.0) / 2.0
+                value = low + position * (high - low) + rand.random() * 1e-9
+                probe.sent[(cmd_type, value)] = monotonic()
+                await websocket.send(json.dumps([cmd_type, value]))
+                await asyncio.sleep(period)
+                if monotonic() >= end:
+                    break
+
+
+def soak(clients=8, rate=60.0, duration=30.0, fixtures=100, port=4322, seed=0):
+    """Run a soak test and return the report."""
+    show = create_show(
+        midi_port=LoopbackMidiPort(),
+        dmx_port=LoopbackDmxPort(),
+        rotos=[RotoQDmx(501), RotoQDmx(503)],
+        dimmers=[Dimmer(address + 1) for address in range(fixtures)],
+        seed=seed,
+    )
+    probe = SoakProbe(show)
+
+    hub = BroadcastHub()
+    show.responders = [hub.publish]
+    Thread(
+        target=lambda: run_websocket_server(port, show.cmd_queue, hub),
+        daemon=True).start()
+    Thread(target=show.run, daemon=True).start()
+    # give the server a moment to start listening
+    sleep(0.5)
+
+    targets = [
+        cmd_type for cmd_type in show.dispatch
+        if cmd_type.rpartition('.')[2] in SLIDERS]
+    uri = "ws://127.0.0.1:{}".format(port)
+
+    async def run_clients():
+        await asyncio.gather(*[
+            drag_sliders(uri, targets, rate, duration, probe, seed + i)
+            for i in range(clients)])
+
+    asyncio.run(run_clients())
+    # let the last commands land
+    sleep(0.1)
+    show.cmd_queue.put(('stop', None))
+    return probe.report()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=60.0, help="messages/s per client")
+    parser.add_argument('--duration', type=float, default=30.0)
+    parser.add_argument('--fixtures', type=int, default=100)
+    parser.add_argument('--port', type=int, default=4322)
+    parser.add_argument('--output', help="write the report to this JSON file")
+    parser.add_argument(
+        '--budget-ms', type=float,
+        help="fail if p99 command latency exceeds this many milliseconds")
+    args = parser.parse_args()
+
+    report = soak(
+        clients=args.clients,
+        rate=args.rate,
+        duration=args.duration,
+        fixtures=args.fixtures,
+        port=args.port)
+
+    json.dump(report, sys.stdout, indent=2)
+    print()
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.budget_ms is not None:
+        p99 = report['command_latency_ms']['p99']
+        if p99 > args.budget_ms:
+            print("p99 command latency {:.2f} ms is over the {} ms budget.".format(
+                p99, args.budget_ms))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""Time each phase of starting a show, up to its first rendered frame."""
+from contextlib import contextmanager
+from time import perf_counter
+
+
+class StartupProfile:
+    """Named startup phases timed against a common start.
+
+    Phases are recorded as (name, started, duration) in seconds since start,
+    which defaults to when the profile is created; pass an earlier
+    perf_counter reading to count work done before then, such as importing
+    this package.
+    """
+    def __init__(self, start=None):
+        self.start = perf_counter() if start is None else start
+        self.phases = []
+        # seconds from start to the end of the first rendered frame
+        self.first_frame = None
+
+    def add(self, name, started, ended):
+        """Record a phase timed with perf_counter readings."""
+        self.phases.append((name, started - self.start, ended - started))
+
+    @contextmanager
+    def phase(self, name):
+        """Time the body of a with statement as a phase."""
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, started, perf_counter())
+
+    def watch_first_frame(self, show, callback=None):
+        """Record when show finishes its first frame, then call callback."""
+        def first_frame():
+            self.first_frame = perf_counter() - self.start
+            # the show is iterating over the old list, so replace rather than mutate
+            show.after_render = [hook for hook in show.after_render if hook is not first_frame]
+            if callback is not None:
+                callback()
+        show.after_render.append(first_frame)
+
+    def report(self):
+        """Return the phases and time to first frame as printable text."""
+        lines = ["Startup profile:"]
+        lines.extend(
+            "  {:>9.1f} ms  {:>9.1f} ms  {}".format(1e3 * started, 1e3 * duration, name)
+            for name, started, duration in self.phases)
+        if self.first_frame is None:
+            lines.append("  first frame not rendered in this process")
+        else:
+            lines.append("  {:>9.1f} ms  first frame".format(1e3 * self.first_frame))
+        return '\n'.join(lines)
@@ -0,0 +1,108 @@
+"""Periodic snapshots of the full show state for warm restarts."""
+import os
+import pickle
+import time
+import traceback
+from queue import Queue
+from threading import Thread
+
+
+def organist_name(organist):
+    return "organist{}".format(organist.ctrl_channel)
+
+
+def capture_state(show):
+    """Return the parameters and runtime state of every entity in the show."""
+    _, parameters = show.snapshot()
+    runtime = {}
+    for name, entity in show.entities.items():
+        state = entity.get_state()
+        if state is not None:
+            runtime[name] = state
+    # color generators such as ColorSwarm have their own RNGs
+    for organist in show.ordered_organists():
+        get_state = getattr(organist.col_gen, 'get_state', None)
+        if get_state is not None:
+            runtime[organist_name(organist) + '.col_gen'] = get_state()
+    return dict(parameters=parameters, runtime=runtime)
+
+
+def restore_state(show, state):
+    """Restore state from capture_state onto a show with the same entities.
+
+    Entities that don't exist in this show are ignored, so a snapshot survives
+    changes to the patch.
+    """
+    for cmd_type, value in state['parameters'].items():
+        try:
+            name, setter = show.dispatch[cmd_type]
+        except KeyError:
+            continue
+        setter(value)
+        show.mark_changed(name)
+
+    runtime = state['runtime']
+    for name, entity in show.entities.items():
+        if name in runtime:
+            entity.set_state(runtime[name])
+    for organist in show.ordered_organists():
+        key = organist_name(organist) + '.col_gen'
+        if key in runtime:
+            organist.col_gen.set_state(runtime[key])
+
+
+def write_state(path, state):
+    """Write a state snapshot to a file, replacing it atomically."""
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, path)
+
+
+def load_state(path):
+    """Load a state snapshot written by write_state."""
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+class StateSnapshotter(Thread):
+    """Periodically write the show state to disk on a background thread.
+
+    The state is captured between frames, right after a frame is output, and
+    handed to this thread to serialize and write so the render thread never
+    waits on pickling or the filesystem.  Nothing is captured while the show
+    renders in parallel, as its runtime state then lives in the workers.
+    """
+    def __init__(self, show, path, interval=1.0):
+        Thread.__init__(self, daemon=True)
+        self.show = show
+        self.path = path
+        self.interval = interval
+        self._due = False
+        self._captured = Queue(maxsize=1)
+
+        show.after_render.append(self._capture_if_due)
+
+    def _capture_if_due(self):
+        if not self._due or self.show.parallel is not None:
+            return
+        self._due = False
+        try:
+            state = capture_state(self.show)
+        except Exception:
+            # skip this snapshot rather than stop the show
+            state = None
+            self.show.respond(('error', traceback.format_exc()))
+        self._captured.put_nowait(state)
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            self._due = True
+            state = self._captured.get()
+            if state is None:
+                continue
+            try:
+                write_state(self.path, state)
+            except Exception as err:
+                print("Error writing show state snapshot:", err)
@@ -0,0 +1,141 @@
+"""Stream live show values to subscribed websocket clients."""
+import json
+import time
+import traceback
+from fnmatch import fnmatchcase
+from threading import Lock, Thread
+
+DMX_FRAME = 'dmx.frame'
+
+
+class Subscription:
+    """The fields a client asked for and the values it was last sent."""
+    def __init__(self, patterns):
+        self.patterns = patterns
+        # keys matching the patterns, resolved again whenever the keys of
+        # the sample change, as when entities are registered
+        self.keys = None
+        self.sample_keys = None
+        self.sent = {}
+
+    def update(self, values):
+        """Return a dict of the subscribed values that changed since last sent.
+
+        DMX frames are reduced to a list of [channel, value] pairs for the
+        channels that changed; the first frame sent is diffed against a
+        blacked-out universe.
+        """
+        if self.sample_keys != values.keys():
+            self.sample_keys = set(values)
+            self.keys = [
+                key for key in values
+                if any(fnmatchcase(key, pattern) for pattern in self.patterns)]
+
+        delta = {}
+        for key in self.keys:
+            value = values[key]
+            last = self.sent.get(key)
+            if key == DMX_FRAME:
+                if last is None:
+                    last = bytes(len(value))
+                changed = [
+                    [channel, level]
+                    for channel, (level, last_level) in enumerate(zip(value, last))
+                    if level != last_level]
+                if changed:
+                    delta[key] = changed
+            elif value != last:
+                delta[key] = value
+            self.sent[key] = value
+        return delta
+
+
+def sample_show(show):
+    """Return every live value in the show, keyed by "name.field"."""
+    values = {}
+
+    def add(name, entity):
+        for field in entity.telemetry:
+            values["{}.{}".format(name, field)] = getattr(entity, field)
+
+    for name, entity in list(show.entities.items()):
+        add(name, entity)
+    for organist in show.ordered_organists():
+        add("organist{}".format(organist.ctrl_channel), organist)
+    if show.dmx_port is not None:
+        values[DMX_FRAME] = bytes(show.dmx_port.dmx_frame)
+    return values
+
+
+class TelemetrySampler(Thread):
+    """Periodically sample live values from the show on a background thread.
+
+    Clients subscribe by sending ["subscribe", patterns], where patterns is a
+    list of glob patterns matched against "name.field" keys, for example
+    ["hue0*.value", "organist*.color", "dmx.frame"].  Each sample sends a
+    ["telemetry", {key: value}] message holding only the fields that changed
+    since that client's previous message.  Sampling and serialization both
+    happen on this thread, never on the render thread.
+    """
+    def __init__(self, hub, sample, framerate, rate=15.0):
+        """Sample by calling sample(), which returns a dict like sample_show."""
+        Thread.__init__(self, daemon=True)
+        if rate <= 0.0 or rate >= framerate:
+            raise ValueError(
+                "Telemetry rate must be positive and below the framerate; got {}."
+                .format(rate))
+        self.hub = hub
+        self.sample = sample
+        self.period = 1.0 / rate
+        self.subscriptions = {}
+        self._lock = Lock()
+
+        hub.client_commands['subscribe'] = self.subscribe
+        hub.client_commands['unsubscribe'] = self.unsubscribe
+
+    def subscribe(self, client, patterns):
+        """Replace a client's subscription with a list of key patterns."""
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        if not isinstance(patterns, list) or not all(
+                isinstance(pattern, str) for pattern in patterns):
+            self.hub.send(client, (
+                'error', "Subscribe to a pattern or a list of patterns; got {!r}".format(
+                    patterns)))
+            return
+        with self._lock:
+            self.subscriptions[client] = Subscription(list(patterns))
+
+    def unsubscribe(self, client, _=None):
+        """Stop sending telemetry to a client."""
+        with self._lock:
+            self.subscriptions.pop(client, None)
+
+    def run(self):
+        while True:
+            time.sleep(self.period)
+
+            with self._lock:
+                for client in list(self.subscriptions):
+                    if client not in self.hub.clients:
+                        del self.subscriptions[client]
+                subscriptions = list(self.subscriptions.items())
+
+            if not subscriptions:
+                continue
+
+            # a failure costs one sample or one client, never the thread
+            try:
+                values = self.sample()
+            except Exception:
+                print("Error sampling telemetry:", traceback.format_exc())
+                continue
+            for client, subscription in subscriptions:
+                try:
+                    delta = subscription.update(values)
+                    if delta:
+                        self.hub.send_threadsafe(client, json.dumps(('telemetry', delta)))
+                except Exception:
+                    self.unsubscribe(client)
+                    self.hub.send_threadsafe(
+                        client, json.dumps(('error', traceback.format_exc())))
@@ -0,0 +1,131 @@
+"""Structured tracing that never blocks the render thread.
+
+The render thread packs fixed-size binary records into a preallocated ring
+buffer; a background thread drains and formats them.  Each subsystem has its
+own enable flag, an attribute on the Tracer, so a disabled trace point costs
+a single attribute check:
+
+    if tracer.dmx:
+        tracer.trace_dmx_window(now, frame, 0, 9)
+
+If the drain falls behind, the oldest records are overwritten and counted as
+dropped rather than ever making the writer wait.
+"""
+import json
+import struct
+from threading import Thread
+from time import sleep
+
+SUBSYSTEMS = ('dmx', 'command')
+
+# record codes
+DMX_WINDOW = 0
+COMMAND = 1
+
+# sequence number, subsystem, code, payload length, timestamp, payload
+_RECORD = struct.Struct('<IBBHd64s')
+_WINDOW_START = struct.Struct('<H')
+MAX_PAYLOAD = 64
+
+
+class Tracer:
+    """Single-writer ring buffer of trace records."""
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.buffer = bytearray(capacity * _RECORD.size)
+        # total number of records ever written
+        self.written = 0
+        for subsystem in SUBSYSTEMS:
+            setattr(self, subsystem, False)
+
+    def enable(self, subsystem, enabled=True):
+        if subsystem not in SUBSYSTEMS:
+            raise ValueError("Unknown trace subsystem: {}".format(subsystem))
+        setattr(self, subsystem, enabled)
+
+    def enable_all(self, enabled=True):
+        for subsystem in SUBSYSTEMS:
+            setattr(self, subsystem, enabled)
+
+    def write(self, subsystem, code, timestamp, payload):
+        """Write a record; payloads longer than MAX_PAYLOAD are truncated."""
+        seq = self.written
+        payload = payload[:MAX_PAYLOAD]
+        _RECORD.pack_into(
+            self.buffer,
+            (seq % self.capacity) * _RECORD.size,
+            seq & 0xFFFFFFFF,
+            subsystem,
+            code,
+            len(payload),
+            timestamp,
+            payload)
+        self.written = seq + 1
+
+    def trace_dmx_window(self, timestamp, dmx_frame, start, length):
+        """Trace a window of a DMX universe."""
+        self.write(
+            SUBSYSTEMS.index('dmx'),
+            DMX_WINDOW,
+            timestamp,
+            _WINDOW_START.pack(start) + bytes(dmx_frame[start:start + length]))
+
+    def trace_command(self, timestamp, cmd):
+        """Trace a command as it is handled."""
+        self.write(
+            SUBSYSTEMS.index('command'),
+            COMMAND,
+            timestamp,
+            json.dumps(cmd, default=repr).encode('utf-8'))
+
+    def read(self, start):
+        """Return records written since start, the new start, and drop count."""
+        written = self.written
+        dropped = 0
+        if written - start > self.capacity:
+            dropped = written - start - self.capacity
+            start = written - self.capacity
+
+        records = []
+        for seq in range(start, written):
+            record = _RECORD.unpack_from(
+                self.buffer, (seq % self.capacity) * _RECORD.size)
+            if record[0] != seq & 0xFFFFFFFF:
+                # overwritten while we were reading
+                dropped += 1
+                continue
+            records.append(record)
+        return records, written, dropped
+
+
+def format_record(record):
+    _, subsystem, code, length, timestamp, payload = record
+    payload = payload[:length]
+    if code == DMX_WINDOW:
+        start, = _WINDOW_START.unpack_from(payload)
+        values = list(payload[_WINDOW_START.size:])
+        body = "[{}:{}] {}".format(start, start + len(values), values)
+    elif code == COMMAND:
+        body = payload.decode('utf-8', errors='replace')
+    else:
+        body = payload.hex()
+    return "{:.4f} {}: {}".format(timestamp, SUBSYSTEMS[subsystem], body)
+
+
+class TraceDrain(Thread):
+    """Background thread that formats trace records and writes them out."""
+    def __init__(self, tracer, output=print, interval=0.05):
+        Thread.__init__(self, daemon=True)
+        self.tracer = tracer
+        self.output = output
+        self.interval = interval
+        self.position = tracer.written
+
+    def run(self):
+        while True:
+            sleep(self.interval)
+            records, self.position, dropped = self.tracer.read(self.position)
+            if dropped:
+                self.output("trace: dropped {} records".format(dropped))
+            for record in records:
+                self.output(format_record(record))
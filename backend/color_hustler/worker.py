@@ -0,0 +1,198 @@
+"""Run the show in a worker process, away from websocket and CLI traffic.
+
+In split-process mode the worker process owns the show and its clock and
+does all generator evaluation and fixture rendering.  The front process
+keeps the websocket server and the command line, so JSON decoding and other
+control-plane work never compete with rendering for the same GIL.
+
+Commands go to the worker and responses come back over shared memory rings
+(see ipc), telemetry samples come back on the response ring, and rendered
+frames are published with the usual FrameExporter.  The worker is started
+with the spawn method, so the front process's main script must be guarded
+with `if __name__ == '__main__'`.
+"""
+import multiprocessing
+from itertools import count
+from queue import Empty, Full
+from threading import Thread
+from time import sleep
+
+from .ipc import RingQueue, ShmRing
+from .telemetry import sample_show
+
+# response types used only between the worker and the front process
+TELEMETRY_SAMPLE = 'worker.telemetry'
+WORKER_STOPPED = 'worker.stopped'
+
+# seconds a command or response waits for room in a full ring before it is
+# given up on
+PUT_TIMEOUT = 1.0
+# seconds between checks that the worker is still alive while it is silent
+LIVENESS_INTERVAL = 0.5
+
+
+def run_worker(cmd_ring_name, resp_ring_name, show_kwargs, dmx_port_factory,
+               telemetry_rate):
+    """Entry point of the worker process."""
+    # imported here as the package imports this module
+    from . import create_show, start_show_services
+
+    commands = RingQueue(ShmRing(cmd_ring_name, shared_tracker=True))
+    responses = RingQueue(ShmRing(resp_ring_name, shared_tracker=True))
+
+    def respond(resp):
+        try:
+            if resp[0] == TELEMETRY_SAMPLE:
+                # another sample follows shortly, so never stall rendering for one
+                responses.put_nowait(resp)
+            else:
+                responses.put(resp, timeout=PUT_TIMEOUT)
+        except Full:
+            if resp[0] != TELEMETRY_SAMPLE:
+                print("The front process isn't reading; dropped a {} response.".format(
+                    resp[0]))
+
+    frame_exporter = None
+    # the front process learns the worker stopped however setup or the show ends
+    try:
+        dmx_port = dmx_port_factory() if dmx_port_factory is not None else None
+        show = create_show(dmx_port=dmx_port, **show_kwargs)
+        show.cmd_queue = commands
+        show.responders = [respond]
+        _, frame_exporter = start_show_services(show)
+
+        def forward_telemetry():
+            period = 1.0 / telemetry_rate
+            while show.running:
+                sleep(period)
+                respond((TELEMETRY_SAMPLE, sample_show(show)))
+
+        show.running = True
+        Thread(target=forward_telemetry, daemon=True).start()
+        show.run()
+    finally:
+        if frame_exporter is not None:
+            frame_exporter.close()
+        try:
+            responses.put((WORKER_STOPPED, None), timeout=PUT_TIMEOUT)
+        except Full:
+            pass
+
+
+class ShowWorker:
+    """The front process's handle on a show running in a worker process.
+
+    put and responders stand in for the show's command queue and responders,
+    and sample returns the latest telemetry for a TelemetrySampler.
+    show_kwargs are passed to create_show in the worker; the DMX port can't
+    cross processes, so pass a function that opens it as dmx_port_factory.
+
+    Once the worker stops, commands are no longer sent; if it stopped with an
+    error, responders are sent an error and exitcode is non-zero.
+    """
+    def __init__(self, show_kwargs, dmx_port_factory=None, telemetry_rate=15.0):
+        self.cmd_ring = ShmRing(create=True)
+        self.resp_ring = ShmRing(create=True)
+        self.commands = RingQueue(self.cmd_ring)
+        self.responses = RingQueue(self.resp_ring)
+        self.responders = []
+        self.telemetry = {}
+        # set once the worker has stopped, whether or not it said so
+        self.stopped = False
+
+        self._requests = count()
+        # snapshot request id to the callback waiting for it
+        self._snapshot_callbacks = {}
+
+        self.process = multiprocessing.get_context('spawn').Process(
+            target=run_worker,
+            args=(
+                self.cmd_ring.name,
+                self.resp_ring.name,
+                show_kwargs,
+                dmx_port_factory,
+                telemetry_rate),
+            daemon=True)
+        self.reader = Thread(target=self._read_responses, daemon=True)
+
+    def start(self):
+        self.process.start()
+        self.reader.start()
+
+    @property
+    def exitcode(self):
+        """The worker's exit code, or None while it is running."""
+        return self.process.exitcode
+
+    def put(self, cmd):
+        """Send a command to the worker; return False if it couldn't be sent.
+
+        A command the worker isn't taking is reported as an error rather than
+        waited on, as commands are also sent from the websocket event loop.
+        """
+        if not self.stopped:
+            try:
+                self.commands.put(cmd, timeout=PUT_TIMEOUT)
+                return True
+            except Full:
+                pass
+        self._respond(('error', "The show worker isn't taking commands; dropped {!r}.".format(
+            cmd)))
+        return False
+
+    def sample(self):
+        """Return the latest telemetry sample received from the worker."""
+        return self.telemetry
+
+    def snapshot(self, since, callback):
+        """Request show.snapshot(since) and call callback(version, parameters)
+        with the result, from the response thread.
+        """
+        request = next(self._requests)
+        self._snapshot_callbacks[request] = callback
+        if not self.put(('snapshot', [request, since])):
+            del self._snapshot_callbacks[request]
+
+    def _respond(self, resp):
+        for respond in self.responders:
+            respond(resp)
+
+    def _read_responses(self):
+        try:
+            self._read_until_stopped()
+        finally:
+            self.stopped = True
+        # WORKER_STOPPED is sent just before the worker exits
+        self.process.join()
+        if self.exitcode:
+            self._respond(('error', "The show worker failed with exit code {}.".format(
+                self.exitcode)))
+
+    def _read_until_stopped(self):
+        while True:
+            try:
+                resp = self.responses.get(timeout=LIVENESS_INTERVAL)
+            except Empty:
+                if self.process.is_alive():
+                    continue
+                # the worker died without saying so
+                return
+            resp_type, payload = resp
+            if resp_type == TELEMETRY_SAMPLE:
+                self.telemetry = payload
+            elif resp_type == WORKER_STOPPED:
+                return
+            elif resp_type == 'snapshot':
+                request, version, parameters = payload
+                callback = self._snapshot_callbacks.pop(request, None)
+                if callback is not None:
+                    callback(version, parameters)
+            else:
+                self._respond(resp)
+
+    def join(self):
+        """Wait for the worker to stop, then release the rings."""
+        self.process.join()
+        self.reader.join()
+        self.cmd_ring.close()
+        self.resp_ring.close()